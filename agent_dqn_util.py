@@ -28,6 +28,7 @@ import warnings
 warnings.filterwarnings('ignore')
 from runtime_config import flags, FLAGS
 from heuristics import *
+from conflict_graph import as_conflict_graph
 
 if not hasattr(flags.FLAGS, 'epsilon'):
     flags.DEFINE_float('epsilon', 1.0, 'initial exploration rate')
@@ -87,6 +88,7 @@ class Agent(object):
         raise NotImplementedError
 
     def makestate(self, adj, wts_nn):
+        cg = as_conflict_graph(adj)
         reduced_nn = wts_nn.shape[0]
         # norm_wts = np.amax(wts_nn) + 1e-9
         # norm_wts = np.amax(wts_nn, axis=0) + 1e-9
@@ -94,12 +96,28 @@ class Agent(object):
         norm_wts = 80000 # 100.0
         features = np.multiply(np.ones([reduced_nn, self.flags.feature_size]), wts_nn / norm_wts)
         features_raw = features.copy()
-        features = sp.lil_matrix(features)
-        features = sparse_to_tuple(features)
-        support = simple_polynomials(adj, self.flags.max_degree)
-        state = {"features": features, "support": support, "features_raw": features_raw, "adj": adj}
+        features = sparse_to_tuple(sp.coo_matrix(features))
+        support = cg.cached(('support', self.flags.max_degree),
+                            lambda: simple_polynomials(cg.adj, self.flags.max_degree))
+        state = {"features": features, "support": support, "features_raw": features_raw, "adj": cg.adj}
         return state
 
+    def packstate(self, states):
+        """Block-diagonal union of states, the GCN outputs of the union stack the outputs of every state"""
+        offsets = np.cumsum([0] + [state['features_raw'].shape[0] for state in states])
+        features_raw = np.vstack([state['features_raw'] for state in states])
+        coords = np.vstack([state['features'][0] + [off, 0] for state, off in zip(states, offsets)])
+        values = np.concatenate([state['features'][1] for state in states])
+        features = (coords, values, features_raw.shape)
+        support = []
+        for i in range(len(states[0]['support'])):
+            coords = np.vstack([state['support'][i][0] + off for state, off in zip(states, offsets)])
+            values = np.concatenate([state['support'][i][1] for state in states])
+            support.append((coords, values, (offsets[-1], offsets[-1])))
+        adj = sp.block_diag([state['adj'] for state in states], format='csr')
+        return {"features": features, "support": support, "features_raw": features_raw, "adj": adj,
+                "offsets": offsets}
+
     def act(self, state, train):
         raise NotImplementedError
 
@@ -151,7 +169,7 @@ class Agent(object):
         """
         GCN followed by LGS
         """
-        adj = adj_0.copy()
+        adj = as_conflict_graph(adj_0)
         wts_nn = np.reshape(wts_0, (wts_0.shape[0], self.flags.feature_size))
 
         # GCN
@@ -232,6 +250,9 @@ class A2CAgent(Agent):
 
     def act(self, state, train):
         act_values = self.predict(state)
+        return self.explore(act_values, train)
+
+    def explore(self, act_values, train):
         if train:
             if np.random.rand() <= self.epsilon:
                 act_values = np.random.uniform(size=act_values.shape)
@@ -304,7 +325,7 @@ class A2CAgent(Agent):
         """
         GCN followed by LGS
         """
-        adj = adj_0.copy()
+        adj = as_conflict_graph(adj_0)
         wts_nn = np.reshape(wts_0, (wts_0.shape[0], self.flags.feature_size))
         # if self.hidden is None:
         #     self.hidden = np.zeros((wts_0.shape[0], self.flags.hidden1))
@@ -317,4 +338,15 @@ class A2CAgent(Agent):
 
         return actions, state
 
-
+    def utility_batch(self, adjs, wts_list, train=False):
+        """
+        GCN of several graphs in one session run over their block-diagonal union, returns (actions, state) per graph
+        """
+        states = []
+        for adj_0, wts_0 in zip(adjs, wts_list):
+            wts_nn = np.reshape(wts_0, (wts_0.shape[0], self.flags.feature_size))
+            states.append(self.makestate(as_conflict_graph(adj_0), wts_nn))
+        packed = self.packstate(states)
+        act_values = self.predict(packed)
+        offsets = packed['offsets']
+        return [(self.explore(act_values[offsets[j]:offsets[j+1]], train), state) for j, state in enumerate(states)]
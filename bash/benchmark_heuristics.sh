@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# run from the repository root, compare against an earlier run with --baseline
+python3 benchmark_heuristics.py --graphs=star10,star20,star30,ba1,ba2,er,tree,tree-line,poisson --sizes=50,1000,10000,100000 --seeds=3 --output=wireless/benchmark_heuristics.csv > wireless/benchmark_heuristics.out ;
@@ -0,0 +1,274 @@
+"""
+Benchmark of the MWIS schedulers in heuristics.py across conflict graph families and sizes.
+
+Every (graph family, size, seed) instance gets one uniform weight vector, every solver that fits the size is timed,
+and its peak memory, rounds and weight relative to the best independent set found on the instance are recorded.
+Solvers are warmed up once per process and the fastest of --repeat runs counts. The ratio column is left empty for
+schedules that are not independent sets, the LP and gradient relaxations report their bound in bound_ratio instead.
+
+    python3 benchmark_heuristics.py --graphs ba2,tree --sizes 50,1000,100000 --output wireless/bench.csv
+    python3 benchmark_heuristics.py --output wireless/bench_new.csv --baseline wireless/bench.csv
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from conflict_graph import ConflictGraph
+import heuristics as hs
+
+
+def _star(n, rng):
+    return nx.star_graph(n - 1)
+
+
+def _ba1(n, rng):
+    return nx.barabasi_albert_graph(n, 1, seed=rng)
+
+
+def _ba2(n, rng):
+    return nx.barabasi_albert_graph(n, 2, seed=rng)
+
+
+def _er(n, rng):
+    # average degree of the 50-node, p=0.1 graphs of the simulators
+    return nx.fast_gnp_random_graph(n, min(1.0, 5.0 / n), seed=rng)
+
+
+def _tree(n, rng):
+    try:
+        return nx.random_powerlaw_tree(n, gamma=3.0, seed=rng, tries=2000)
+    except nx.NetworkXError:
+        # power-law degree sequences rarely form a tree beyond a few hundred nodes, use a random recursive tree
+        graph = nx.empty_graph(n)
+        if n > 1:
+            parents = np.floor(rng.uniform(0, 1, n - 1) * np.arange(1, n)).astype(int)
+            graph.add_edges_from(zip(range(1, n), parents.tolist()))
+        return graph
+
+
+def _tree_line(n, rng):
+    # the line graph of a tree with n + 1 nodes has n vertices
+    return nx.convert_node_labels_to_integers(nx.line_graph(_tree(n + 1, rng)))
+
+
+def _poisson(n, rng, degree=6.0):
+    # n links placed by a Poisson point process, conflicts within unit distance
+    side = np.sqrt(n * np.pi / degree)
+    xys = rng.uniform(0, side, (n, 2))
+    graph = nx.empty_graph(n)
+    graph.add_edges_from(cKDTree(xys).query_pairs(1.0))
+    return graph
+
+
+FAMILIES = {
+    'star': _star,
+    'ba1': _ba1,
+    'ba2': _ba2,
+    'er': _er,
+    'tree': _tree,
+    'tree-line': _tree_line,
+    'poisson': _poisson,
+}
+
+# graph names of the simulators with a fixed size, the size is the number of vertices
+FIXED = {'star10': ('star', 11), 'star20': ('star', 21), 'star30': ('star', 31)}
+
+
+def _integral(fn):
+    def run(cg, wts):
+        out = fn(cg, wts)
+        mwis = np.array(sorted(out[0]), dtype=np.int64)
+        rounds = out[2] if len(out) > 2 else np.nan
+        return np.sum(wts[mwis]), rounds, cg.is_independent(mwis)
+    return run
+
+
+def _relaxed(fn):
+    def run(cg, wts):
+        vec = fn(cg, wts)
+        return float(np.dot(wts, vec)), np.nan, None
+    return run
+
+
+def _exact(solver, **kwargs):
+    def run(cg, wts):
+        mwis, total_wt, info = hs.mwis_exact(cg, wts, solver=solver, timeout=60, **kwargs)
+        return total_wt, info['nodes'], cg.is_independent(mwis)
+    return run
+
+
+def _enumerate(cg, wts):
+    mwis, best = hs.mwis_enumerate(cg, wts)
+    return best[0], np.nan, cg.is_independent(np.flatnonzero(mwis[0]))
+
+
+# name: (runner, largest graph it runs on, integral schedule)
+SOLVERS = {
+    'greedy': (_integral(hs.greedy_search), None, True),
+    'heap_greedy': (_integral(hs.heap_greedy_search), None, True),
+    'heap_greedy_dw': (_integral(lambda a, w: hs.heap_greedy_search(a, w, degree_weighted=True)), None, True),
+    'dist_greedy': (_integral(lambda a, w: hs.dist_greedy_search_stats(a, w, 0.1)), None, True),
+    'lgs': (_integral(hs.local_greedy_search_count), None, True),
+    'mp_greedy': (_integral(hs.mp_greedy_count), 20000, True),
+    'mp_color09': (_integral(hs.mp_color09_count), 20000, True),
+    'mp_ising': (_integral(hs.mp_ising), 5000, True),
+    'lp_edge': (_relaxed(hs.mwis_mip_edge_relax), 100000, False),
+    'lp_clique': (_relaxed(hs.mwis_mip_clique_relax), 20000, False),
+    'gradient_projection': (_relaxed(hs.gradient_projection), 100000, False),
+    'exact_milp': (_exact('milp'), 10000, True),
+    'exact_bnb': (_exact('bnb', reduce=True), 200, True),
+    'enumerate': (_enumerate, 40, True),
+}
+
+KEYS = ['graph', 'n', 'seed', 'solver']
+
+
+def build_instance(graph, n, seed):
+    rng = np.random.RandomState(seed)
+    family, n = FIXED.get(graph, (graph, n))
+    graph_i = FAMILIES[family](n, rng)
+    cg = ConflictGraph(nx.adjacency_matrix(graph_i))
+    wts = rng.uniform(0, 1, cg.n)
+    return cg, wts
+
+
+def warm_up(solvers):
+    """Run every solver once on a small instance, so lazy imports and numba compilation are not timed"""
+    cg, wts = build_instance('ba2', 30, 0)
+    for name in solvers:
+        SOLVERS[name][0](cg, wts)
+
+
+def measure(runner, cg, wts, seed=0, repeat=3, budget=2.0, memory=True):
+    '''
+    Time a solver on one instance
+    :param seed: seed of the global numpy random state before every run, randomized solvers repeat their result
+    :param repeat: timed runs, the fastest one is reported
+    :param budget: no further runs once the timed runs took this many seconds
+    :param memory: one more run under tracemalloc for the peak memory
+    :return: weight, rounds, valid, fastest time, peak memory in MB
+    '''
+    times = []
+    while len(times) < max(1, repeat) and sum(times) < budget:
+        np.random.seed(seed)
+        t0 = time.perf_counter()
+        weight, rounds, valid = runner(cg, wts)
+        times.append(time.perf_counter() - t0)
+    peak = np.nan
+    if memory:
+        # extra run under tracemalloc, it slows the solver down
+        np.random.seed(seed)
+        tracemalloc.start()
+        runner(cg, wts)
+        peak = tracemalloc.get_traced_memory()[1] / 2.0**20
+        tracemalloc.stop()
+    return weight, rounds, valid, min(times), peak
+
+
+def run_benchmark(graphs, sizes, seeds, solvers, repeat=3, memory=True, verbose=True):
+    rows = []
+    warm_up(solvers)
+    for graph in graphs:
+        graph_sizes = [FIXED[graph][1]] if graph in FIXED else sizes
+        for n in graph_sizes:
+            for seed in seeds:
+                cg, wts = build_instance(graph, n, seed)
+                inst = []
+                for name in solvers:
+                    runner, max_n, integral = SOLVERS[name]
+                    if max_n is not None and cg.n > max_n:
+                        continue
+                    weight, rounds, valid, elapsed, peak = measure(runner, cg, wts, seed, repeat, memory=memory)
+                    inst.append({'graph': graph, 'n': cg.n, 'm': cg.edges.shape[0], 'seed': seed, 'solver': name,
+                                 'integral': integral, 'valid': valid, 'time': elapsed, 'peak_mb': peak,
+                                 'rounds': rounds, 'weight': weight})
+                    if verbose:
+                        print("{} n {} seed {} {}: {:.4f}s, weight {:.3f}".format(graph, cg.n, seed, name, elapsed, weight))
+                        sys.stdout.flush()
+                best = max([r['weight'] for r in inst if r['integral'] and r['valid']] + [0.0])
+                for r in inst:
+                    # ratio only for independent sets, relaxations bound the best weight from above
+                    r['ratio'] = r['weight'] / best if best > 0 and r['integral'] and r['valid'] else np.nan
+                    r['bound_ratio'] = r['weight'] / best if best > 0 and not r['integral'] else np.nan
+                rows += inst
+    return pd.DataFrame(rows)
+
+
+def compare(res_df, base_df, time_tol=0.2, abs_tol=0.01, ratio_tol=1e-6):
+    '''
+    Join a run with a baseline and flag regressions
+    :param time_tol: relative slowdown a regression needs
+    :param abs_tol: slowdown in seconds a regression needs as well, jitter of fast solvers stays below it
+    :param ratio_tol: drop of the weight ratio that is a regression, an independent set that turned invalid is one too
+    :return: joined data frame with speedup and regression columns
+    '''
+    cmp_df = res_df.merge(base_df[KEYS + ['time', 'ratio', 'peak_mb']], on=KEYS, suffixes=('', '_base'))
+    cmp_df['speedup'] = cmp_df['time_base'] / cmp_df['time']
+    slower = (cmp_df['time'] > cmp_df['time_base'] * (1 + time_tol)) & (cmp_df['time'] - cmp_df['time_base'] > abs_tol)
+    worse = (cmp_df['ratio'] < cmp_df['ratio_base'] - ratio_tol) | (cmp_df['ratio'].isna() & cmp_df['ratio_base'].notna())
+    cmp_df['regression'] = slower | worse
+    return cmp_df
+
+
+def save(df, path):
+    if path.endswith('.json'):
+        df.to_json(path, orient='records', indent=1)
+    else:
+        df.to_csv(path, index=False)
+
+
+def load(path):
+    if path.endswith('.json'):
+        return pd.read_json(path, orient='records')
+    return pd.read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--graphs', default='star10,star20,star30,ba1,ba2,er,tree,tree-line,poisson',
+                        help='comma separated graph families')
+    parser.add_argument('--sizes', default='50,1000,10000,100000', help='comma separated numbers of vertices')
+    parser.add_argument('--seeds', type=int, default=3, help='instances per family and size')
+    parser.add_argument('--solvers', default=','.join(SOLVERS), help='comma separated solvers')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per solver and instance, the fastest counts')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run of every solver')
+    parser.add_argument('--output', default='benchmark_heuristics.csv', help='.csv or .json result file')
+    parser.add_argument('--baseline', default='', help='result file of an earlier run to compare against')
+    parser.add_argument('--time-tol', type=float, default=0.2, help='relative slowdown reported as a regression')
+    parser.add_argument('--abs-tol', type=float, default=0.01, help='slowdown in seconds a regression needs as well')
+    args = parser.parse_args(argv)
+
+    graphs = args.graphs.split(',')
+    sizes = [int(s) for s in args.sizes.split(',')]
+    solvers = args.solvers.split(',')
+    for name in graphs:
+        if name not in FAMILIES and name not in FIXED:
+            parser.error("unknown graph: {}".format(name))
+    for name in solvers:
+        if name not in SOLVERS:
+            parser.error("unknown solver: {}".format(name))
+
+    res_df = run_benchmark(graphs, sizes, range(args.seeds), solvers, repeat=args.repeat,
+                           memory=not args.no_memory)
+    save(res_df, args.output)
+    summary = res_df.groupby(['graph', 'n', 'solver'])[['time', 'peak_mb', 'rounds', 'ratio', 'bound_ratio']].mean()
+    print(summary.to_string())
+    if not args.baseline:
+        return 0
+    cmp_df = compare(res_df, load(args.baseline), time_tol=args.time_tol, abs_tol=args.abs_tol)
+    regressions = cmp_df[cmp_df['regression']]
+    print("Compared {} runs with {}: {} regressions".format(len(cmp_df), args.baseline, len(regressions)))
+    if len(regressions) > 0:
+        print(regressions[KEYS + ['time', 'time_base', 'ratio', 'ratio_base']].to_string(index=False))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
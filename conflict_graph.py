@@ -0,0 +1,219 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+
+def _readonly(arr):
+    arr.flags.writeable = False
+    return arr
+
+
+class ConflictGraph(object):
+    """
+    Immutable conflict graph with a precomputed neighbour index, built once per topology.
+    Holds the CSR arrays, degree vector and upper-triangle edge list of a symmetric adjacency
+    matrix; derived data (normalized Laplacian, cliques, line graph, ...) is computed lazily
+    and cached on the object.
+    """
+    def __init__(self, adj):
+        adj = sp.csr_matrix(adj)
+        n = adj.shape[0]
+        rows = np.repeat(np.arange(n), np.diff(adj.indptr))
+        # drop self-loops and explicit zeros, neighbours are what np.nonzero(adj[v]) sees
+        keep = (adj.data != 0) & (rows != adj.indices)
+        rows = rows[keep]
+        cols = adj.indices[keep]
+        order = np.lexsort((cols, rows))
+        rows = rows[order]
+        cols = cols[order]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        self._n = n
+        self._indptr = _readonly(indptr)
+        self._indices = _readonly(cols.astype(np.int64))
+        self._src = _readonly(rows.astype(np.int64))
+        self._degree = _readonly(np.diff(indptr))
+        upper = rows < cols
+        self._edges = _readonly(np.stack((rows[upper], cols[upper]), axis=1))
+        self._adj = sp.csr_matrix((np.ones(cols.size), cols, indptr), shape=(n, n))
+        self._cache = {}
+
+    @property
+    def n(self):
+        """Number of vertices (links)"""
+        return self._n
+
+    @property
+    def shape(self):
+        return self._n, self._n
+
+    @property
+    def indptr(self):
+        return self._indptr
+
+    @property
+    def indices(self):
+        return self._indices
+
+    @property
+    def src(self):
+        """Row index of every CSR entry, aligned with indices"""
+        return self._src
+
+    @property
+    def degree(self):
+        return self._degree
+
+    @property
+    def edges(self):
+        """Undirected edge list (u, v) with u < v, shape (m, 2)"""
+        return self._edges
+
+    @property
+    def adj(self):
+        """Binary adjacency matrix (scipy.sparse.csr_matrix), do not modify"""
+        return self._adj
+
+    @property
+    def key(self):
+        """Hash of the CSR structure, equal for equal topologies"""
+        def build():
+            digest = hashlib.sha1(np.int64(self._n).tobytes())
+            digest.update(self._indptr.tobytes())
+            digest.update(self._indices.tobytes())
+            return digest.hexdigest()
+        return self.cached('key', build)
+
+    def neighbors(self, v):
+        return self._indices[self._indptr[v]:self._indptr[v + 1]]
+
+    def cached(self, key, builder):
+        """Return derived data stored under key, calling builder() on the first request"""
+        if key not in self._cache:
+            self._cache[key] = builder()
+        return self._cache[key]
+
+    @property
+    def graph(self):
+        """networkx graph of the topology"""
+        def build():
+            g = nx.Graph()
+            g.add_nodes_from(range(self._n))
+            g.add_edges_from(self._edges.tolist())
+            return g
+        return self.cached('graph', build)
+
+    @property
+    def laplacian(self):
+        """Symmetric normalized Laplacian I - D^-1/2 A D^-1/2"""
+        def build():
+            d_inv_sqrt = np.zeros(self._n)
+            nz = self._degree > 0
+            d_inv_sqrt[nz] = np.power(self._degree[nz], -0.5)
+            vals = d_inv_sqrt[self._src] * d_inv_sqrt[self._indices]
+            norm_adj = sp.csr_matrix((vals, self._indices, self._indptr), shape=self.shape)
+            return sp.eye(self._n, format='csr') - norm_adj
+        return self.cached('laplacian', build)
+
+    @property
+    def cliques(self):
+        """Maximal cliques of the graph, list of vertex lists"""
+        return self.cached('cliques', lambda: list(nx.algorithms.clique.find_cliques(self.graph)))
+
+    @property
+    def line_graph(self):
+        """networkx line graph of the topology"""
+        return self.cached('line_graph', lambda: nx.line_graph(self.graph))
+
+    def is_independent(self, vertices):
+        mask = np.zeros(self._n, dtype=bool)
+        mask[np.array(list(vertices), dtype=np.int64)] = True
+        return not np.any(mask[self._src] & mask[self._indices])
+
+
+def greedy_clique_cover(cg):
+    """Cliques covering every edge, each grown greedily from an uncovered edge"""
+    covered = set()
+    nbrs = [set(cg.neighbors(v).tolist()) for v in range(cg.n)]
+    cliques = []
+    for u, v in cg.edges.tolist():
+        if (u, v) in covered:
+            continue
+        clique = [u, v]
+        common = nbrs[u] & nbrs[v]
+        while common:
+            # prefer the vertex with the most uncovered edges into the clique
+            x = max(sorted(common), key=lambda c: sum((min(c, y), max(c, y)) not in covered for y in clique))
+            clique.append(x)
+            common &= nbrs[x]
+        for i in range(len(clique)):
+            for j in range(i + 1, len(clique)):
+                covered.add((min(clique[i], clique[j]), max(clique[i], clique[j])))
+        cliques.append(sorted(clique))
+    return cliques
+
+
+def _incidence(cliques, n):
+    rows = np.repeat(np.arange(len(cliques)), [len(c) for c in cliques])
+    cols = np.array([v for c in cliques for v in c], dtype=np.int64)
+    return sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(len(cliques), n))
+
+
+class CliqueCoverCache(object):
+    """
+    LRU cache of clique incidence matrices keyed by topology, optionally persisted as .npz files in cache_dir.
+    kind 'maximal' holds the maximal cliques with at least two vertices, 'greedy' a greedy edge clique cover.
+    """
+    def __init__(self, maxsize=64, cache_dir=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._store = OrderedDict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, 'cliques_{}_{}.npz'.format(*key))
+
+    def get(self, cg, kind='maximal'):
+        key = (cg.key, kind)
+        if key in self._store:
+            self._store.move_to_end(key)
+            return self._store[key]
+        if self.cache_dir is not None and os.path.isfile(self._path(key)):
+            incidence = sp.load_npz(self._path(key)).tocsr()
+        else:
+            if kind == 'maximal':
+                cliques = [c for c in cg.cliques if len(c) > 1]
+            elif kind == 'greedy':
+                cliques = greedy_clique_cover(cg)
+            else:
+                raise ValueError("unknown clique cover: {}".format(kind))
+            incidence = _incidence(cliques, cg.n)
+            if self.cache_dir is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                sp.save_npz(self._path(key), incidence)
+        self._store[key] = incidence
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+        return incidence
+
+    def clear(self):
+        self._store.clear()
+
+
+clique_cache = CliqueCoverCache()
+
+
+def clique_incidence(adj, kind='maximal'):
+    """Clique incidence matrix (cliques x vertices) of a topology from clique_cache, do not modify"""
+    cg = as_conflict_graph(adj)
+    return cg.cached(('clique_incidence', kind), lambda: clique_cache.get(cg, kind))
+
+
+def as_conflict_graph(adj):
+    """Wrap an adjacency matrix as a ConflictGraph, a ConflictGraph is returned as is"""
+    if isinstance(adj, ConflictGraph):
+        return adj
+    return ConflictGraph(adj)
@@ -0,0 +1,131 @@
+from collections import deque
+
+import numpy as np
+
+from conflict_graph import ConflictGraph, as_conflict_graph
+
+
+class Reduction(object):
+    """
+    Residual graph of an MWIS instance after reduction, with the record to lift a residual solution back.
+    The MWIS weight of the original graph is the MWIS weight of the residual graph plus offset.
+    """
+    def __init__(self, n, kernel, residual, weights, offset, records):
+        self.n = n
+        self.kernel = kernel
+        self.residual = residual
+        self.weights = weights
+        self.offset = offset
+        self._records = records
+
+    def lift(self, mwis):
+        '''
+        Map an independent set of the residual graph back to the original graph
+        :param mwis: vertices of the residual graph
+        :return: sorted vertices of the original graph
+        '''
+        solu = np.zeros(self.n, dtype=bool)
+        solu[self.kernel[np.array(list(mwis), dtype=np.int64)]] = True
+        for op, v, u in reversed(self._records):
+            if op == 'in':
+                solu[v] = True
+            else:
+                # folded pendant v joins unless its neighbour u did
+                solu[v] = not solu[u]
+        return np.flatnonzero(solu)
+
+
+def reduce_graph(adj, wts):
+    '''
+    Shrink an MWIS instance with reduction rules that keep an optimal solution
+    Rules: drop non-positive weights, include isolated vertices, include a pendant vertex at least as heavy as its
+    neighbour or fold it into the neighbour, include a simplicial vertex at least as heavy as its neighbours, and
+    drop a neighbour u of v when N[v] is a subset of N[u] and w(v) >= w(u) (weighted dominance).
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :return: Reduction
+    '''
+    cg = as_conflict_graph(adj)
+    n = cg.n
+    w = np.array(wts, dtype=float).flatten().tolist()
+    nbrs = [set(cg.neighbors(v).tolist()) for v in range(n)]
+    alive = [True] * n
+    records = []
+    offset = 0.0
+    queue = deque(range(n))
+    queued = [True] * n
+
+    def push(v):
+        if alive[v] and not queued[v]:
+            queued[v] = True
+            queue.append(v)
+
+    def remove(v):
+        alive[v] = False
+        for u in nbrs[v]:
+            nbrs[u].discard(v)
+            push(u)
+        nbrs[v] = set()
+
+    def include(v):
+        records.append(('in', v, -1))
+        for u in list(nbrs[v]):
+            remove(u)
+        remove(v)
+        return w[v]
+
+    while queue:
+        v = queue.popleft()
+        queued[v] = False
+        if not alive[v]:
+            continue
+        nv = nbrs[v]
+        if w[v] <= 0:
+            remove(v)
+        elif len(nv) == 0:
+            offset += include(v)
+        elif len(nv) == 1:
+            u = next(iter(nv))
+            if w[v] >= w[u]:
+                offset += include(v)
+            else:
+                # fold v into u: take w(v) now, u keeps the surplus and excludes v if chosen
+                records.append(('fold', v, u))
+                offset += w[v]
+                w[u] -= w[v]
+                remove(v)
+                # a lighter u can now be dominated by its neighbours
+                for x in nbrs[u]:
+                    push(x)
+        else:
+            # neighbours whose closed neighbourhood contains N[v]
+            dominated = [u for u in nv if len(nv - nbrs[u]) == 1]
+            if len(dominated) == len(nv) and w[v] >= max(w[u] for u in nv):
+                # simplicial vertex, N(v) is a clique
+                offset += include(v)
+            else:
+                for u in dominated:
+                    if w[u] <= w[v]:
+                        remove(u)
+
+    kernel = np.flatnonzero(alive)
+    residual = ConflictGraph(cg.adj[kernel][:, kernel])
+    weights = np.array(w)[kernel]
+    return Reduction(n, kernel, residual, weights, offset, records)
+
+
+def solve_reduced(adj, wts, solver, **kwargs):
+    '''
+    Run an MWIS solver on the reduced instance and lift its solution
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param solver: solver(adj, wts, **kwargs) returning the MWIS as its first element
+    :return: mwis, total_wt
+    '''
+    wts = np.array(wts, dtype=float).flatten()
+    red = reduce_graph(adj, wts)
+    mwis = []
+    if red.residual.n > 0:
+        mwis = solver(red.residual, red.weights, **kwargs)[0]
+    solu = red.lift(mwis)
+    return set(solu.tolist()), np.sum(wts[solu])
@@ -8,6 +8,7 @@ import dwave_networkx as dnx
 import os
 from itertools import chain, combinations
 from heuristics import greedy_search
+from conflict_graph import as_conflict_graph
 
 
 def power_set(iterable):
@@ -120,8 +121,7 @@ def mwis_heuristic_greedy(graph):
 
 
 def mis_check(adj, mis):
-    graph = nx.from_scipy_sparse_matrix(adj)
-    result = dnx.is_independent_set(graph, mis)
+    result = as_conflict_graph(adj).is_independent(mis)
     return result
 
 
@@ -2,14 +2,45 @@ import networkx as nx
 import dwave_networkx as dnx
 import igraph as ig
 import pulp as plp
-from pulp import GLPK
 import numpy as np
-import pandas as pd
 import scipy.sparse as sp
 import time
+import heapq
+try:
+    # optional, compiles the sequential greedy sweep
+    from numba import njit
+except ImportError:
+    njit = None
+from conflict_graph import ConflictGraph, as_conflict_graph, clique_incidence
+from graph_reduction import reduce_graph
 print(nx.__version__)
 
 
+def _greedy_sweep(indptr, indices, orders):
+    '''
+    Sequential greedy over vertex orders, a vertex joins unless a neighbour already did
+    :param indptr: CSR row pointers of the conflict graph
+    :param indices: CSR column indices of the conflict graph
+    :param orders: vertex order of every weight vector, shape (B, n)
+    :return: boolean schedules, shape (B, n)
+    '''
+    batch, n = orders.shape
+    mwis = np.zeros((batch, n), dtype=np.bool_)
+    blocked = np.zeros(n, dtype=np.bool_)
+    for b in range(batch):
+        blocked[:] = False
+        for i in orders[b]:
+            if blocked[i]:
+                continue
+            mwis[b, i] = True
+            blocked[indices[indptr[i]:indptr[i + 1]]] = True
+    return mwis
+
+
+if njit is not None:
+    _greedy_sweep = njit(cache=True)(_greedy_sweep)
+
+
 def greedy_search(adj, wts):
     '''
     Return MWIS set and the total weights of MWIS
@@ -17,61 +48,225 @@ def greedy_search(adj, wts):
     :param wts: weights of vertices
     :return: mwis, total_wt
     '''
+    cg = as_conflict_graph(adj)
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    ranks = np.argsort(-wts.flatten())
-    wts_desc = wts[ranks]
-    verts_desc = verts[ranks]
-    mwis = set()
-    nb_is = set()
-    total_ws = 0.0
-    for i in ranks:
-        if i in nb_is:
+    ranks = np.argsort(-wts)
+    solu = np.flatnonzero(_greedy_sweep(cg.indptr, cg.indices, ranks[None, :])[0])
+    total_ws = np.sum(wts[solu])
+    return set(solu.tolist()), total_ws
+
+
+def _heap_before(key, a, b):
+    # heap order of vertices a and b, ties broken by the lower index
+    return key[a] < key[b] or (key[a] == key[b] and a < b)
+
+
+def _heap_sift_down(heap, pos, key, i, size):
+    # move heap[i] down to its place below a larger key
+    v = heap[i]
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and _heap_before(key, heap[child + 1], heap[child]):
+            child += 1
+        if not _heap_before(key, heap[child], v):
+            break
+        heap[i] = heap[child]
+        pos[heap[i]] = i
+        i = child
+    heap[i] = v
+    pos[v] = i
+
+
+def _heap_sift(heap, pos, key, i, size):
+    # move heap[i] up or down to its place after its key changed
+    v = heap[i]
+    while i > 0:
+        parent = (i - 1) // 2
+        if not _heap_before(key, v, heap[parent]):
+            break
+        heap[i] = heap[parent]
+        pos[heap[i]] = i
+        i = parent
+    heap[i] = v
+    pos[v] = i
+    _heap_sift_down(heap, pos, key, i, size)
+
+
+def _gwmin_sweep(indptr, indices, wts, deg):
+    '''
+    Sequential greedy that takes the vertex of largest w/(d+1) on the residual graph, d its residual degree.
+    An indexed binary heap updates the keys in place, memory stays O(V) next to the CSR arrays
+    :param indptr: CSR row pointers of the conflict graph
+    :param indices: CSR column indices of the conflict graph
+    :param wts: weights of vertices, float
+    :param deg: degrees of vertices, updated in place
+    :return: boolean schedule
+    '''
+    n = wts.shape[0]
+    key = -wts / (deg + 1.0)
+    heap = np.arange(n)
+    pos = np.arange(n)
+    for i in range(n // 2 - 1, -1, -1):
+        _heap_sift_down(heap, pos, key, i, n)
+    alive = np.ones(n, dtype=np.bool_)
+    mwis = np.zeros(n, dtype=np.bool_)
+    removed = np.empty(n, dtype=np.int64)
+    size = n
+    while size > 0:
+        # vertices leave the heap only at the root, removed neighbours are skipped when they get there
+        v = heap[0]
+        size -= 1
+        heap[0] = heap[size]
+        pos[heap[0]] = 0
+        _heap_sift_down(heap, pos, key, 0, size)
+        if not alive[v]:
             continue
-        _, nb_set = np.nonzero(adj[i])
-        mwis.add(i)
-        nb_is = nb_is.union(set(nb_set))
-    total_ws = np.sum(wts[list(mwis)])
-    return mwis, total_ws
+        mwis[v] = True
+        alive[v] = False
+        n_removed = 0
+        for j in range(indptr[v], indptr[v + 1]):
+            u = indices[j]
+            if alive[u]:
+                alive[u] = False
+                removed[n_removed] = u
+                n_removed += 1
+        for r in range(n_removed):
+            u = removed[r]
+            for j in range(indptr[u], indptr[u + 1]):
+                x = indices[j]
+                if alive[x]:
+                    deg[x] -= 1
+                    key[x] = -wts[x] / (deg[x] + 1.0)
+                    _heap_sift(heap, pos, key, pos[x], size)
+    return mwis
 
 
-def dist_greedy_search(adj, wts, epislon=0.5):
+if njit is not None:
+    _heap_before = njit(cache=True)(_heap_before)
+    _heap_sift_down = njit(cache=True)(_heap_sift_down)
+    _heap_sift = njit(cache=True)(_heap_sift)
+    _gwmin_sweep = njit(cache=True)(_gwmin_sweep)
+
+
+def heap_greedy_search(adj, wts, degree_weighted=False):
     '''
-    Return MWIS set and the total weights of MWIS
+    Sequential greedy MWIS in priority order, O((V+E) log V), on the CSR arrays of the conflict graph
     :param adj: adjacency matrix (sparse)
     :param wts: weights of vertices
-    :param epislon: 0<epislon<1, to determin alpha and beta
+    :param degree_weighted: rank vertices by w/(d+1) on the residual graph (GWMIN) instead of w
     :return: mwis, total_wt
     '''
-    alpha = 1.0 + (epislon / 3.0)
-    beta = 3.0 / epislon
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts, dtype=float).flatten()
+    if degree_weighted:
+        solu = np.flatnonzero(_gwmin_sweep(cg.indptr, cg.indices, wts, cg.degree.astype(np.int64)))
+    else:
+        # the priorities never change, a stable sort gives the heap order
+        order = np.argsort(-wts, kind='stable')
+        solu = np.flatnonzero(_greedy_sweep(cg.indptr, cg.indices, order[None, :])[0])
+    total_ws = np.sum(wts[solu])
+    return set(solu.tolist()), total_ws
+
+
+def _batch_priority(order):
+    '''
+    Turn per-row vertex orders into per-row priorities, first in order wins
+    :param order: vertex order of every weight vector, shape (B, n)
+    :return: priorities, shape (B, n)
+    '''
+    batch, n = order.shape
+    prio = np.empty(order.shape, dtype=np.int64)
+    np.put_along_axis(prio, order, np.broadcast_to(np.arange(n - 1, -1, -1), (batch, n)), axis=1)
+    return prio
+
+
+def lgs_priority(wts):
+    '''
+    Rank vertices by descending weight, ties broken by the lower index
+    :param wts: weights of vertices
+    :return: integer priority per vertex, larger wins
+    '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    remain = set(verts.flatten())
-    nb_is = set()
-    while len(remain) > 0:
-        seta = set()
-        for v in remain:
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            if len(nb_set) == 0:
-                seta.add(v)
-                continue
-            w_bar_v = wts[list(nb_set)].max()
-            if wts[v] >= w_bar_v / alpha:
-                seta.add(v)
-        mis_i = set()
-        for v in seta:
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set)
-            if len(mis_i.intersection(nb_set)) == 0:
-                mis_i.add(v)
-                nb_is = nb_is.union(nb_set)
-        mwis = mwis.union(mis_i)
-        remain = remain - mwis - nb_is
-    total_ws = np.sum(wts[list(mwis)])
-    return mwis, total_ws
+    return _batch_priority(np.argsort(-wts, kind='stable')[None, :])[0]
+
+
+# stats mask of local_greedy_kernel, counters that are not requested are not computed
+LGS_ROUNDS = 1
+LGS_P2P = 2
+LGS_BROADCAST = 4
+LGS_OVERHEAD = 8
+
+
+def _lgs_rounds(src, dst, prio, stats=0, max_rounds=None):
+    '''
+    Round-synchronous local greedy scheduling on CSR arrays
+    :param src: row index of every CSR entry of the conflict graph
+    :param dst: column index of every CSR entry of the conflict graph
+    :param prio: unique integer priority per vertex, larger wins
+    :param stats: mask of LGS_* counters to collect
+    :param max_rounds: stop after this many rounds, None to run to completion
+    :return: boolean indicator of the MWIS, dict of counters
+    '''
+    n = prio.size
+    remain = np.ones(n, dtype=bool)
+    mwis = np.zeros(n, dtype=bool)
+    nb_max = np.empty(n, dtype=prio.dtype)
+    info = {'rounds': 0}
+    if stats & LGS_P2P:
+        info['p2p'] = 0
+    if stats & LGS_BROADCAST:
+        info['bst'] = 0
+    if stats & LGS_OVERHEAD:
+        info['overhead'] = np.zeros(n, dtype=np.int64)
+    cap = np.inf if max_rounds is None else max_rounds
+    while src.size > 0 and info['rounds'] < cap:
+        # max neighbour priority over the remaining vertices, edges sorted by src
+        heads = np.flatnonzero(np.concatenate(([True], src[1:] != src[:-1])))
+        nb_max.fill(-1)
+        nb_max[src[heads]] = np.maximum.reduceat(prio[dst], heads)
+        sel = remain & (prio > nb_max)
+        if stats & LGS_P2P:
+            info['p2p'] += src.size
+        if stats & LGS_BROADCAST:
+            info['bst'] += int(np.count_nonzero(remain))
+        if stats & LGS_OVERHEAD:
+            # one message per remaining neighbour, plus a mute signal from a winner with neighbours
+            info['overhead'][src[heads]] += np.diff(np.append(heads, src.size))
+            info['overhead'][sel & (nb_max >= 0)] += 1
+        mwis |= sel
+        remain &= ~sel
+        remain[dst[sel[src]]] = False
+        active = remain[src] & remain[dst]
+        src = src[active]
+        dst = dst[active]
+        info['rounds'] += 1
+    # vertices without remaining neighbours join in the last round
+    if info['rounds'] < cap and np.any(remain):
+        if stats & LGS_BROADCAST:
+            info['bst'] += int(np.count_nonzero(remain))
+        mwis |= remain
+        remain[:] = False
+        info['rounds'] += 1
+    if stats & LGS_BROADCAST:
+        info['bst'] += int(np.count_nonzero(mwis))
+    # vertices removed as neighbours of the MWIS
+    info['nb_is'] = ~(remain | mwis)
+    return mwis, info
+
+
+def local_greedy_kernel(adj, wts, stats=0, max_rounds=None):
+    '''
+    Local greedy search with opt-in instrumentation
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param stats: mask of LGS_ROUNDS, LGS_P2P, LGS_BROADCAST, LGS_OVERHEAD
+    :param max_rounds: stop after this many rounds, None to run to completion
+    :return: boolean indicator of the MWIS, dict of counters
+    '''
+    cg = as_conflict_graph(adj)
+    return _lgs_rounds(cg.src, cg.indices, lgs_priority(wts), stats, max_rounds)
 
 
 def local_greedy_search(adj, wts):
@@ -82,38 +277,8 @@ def local_greedy_search(adj, wts):
     :return: mwis, total_wt
     '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    remain = set(verts.flatten())
-    vidx = list(remain)
-    nb_is = set()
-    while len(remain) > 0:
-        for v in remain:
-            # if v in nb_is:
-            #     continue
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            if len(nb_set) == 0:
-                mwis.add(v)
-                continue
-            nb_list = list(nb_set)
-            nb_list.sort()
-            wts_nb = wts[nb_list]
-            w_bar_v = wts_nb.max()
-            if wts[v] > w_bar_v:
-                mwis.add(v)
-                nb_is = nb_is.union(set(nb_set))
-            elif wts[v] == w_bar_v:
-                i = list(wts_nb).index(wts[v])
-                nbv = nb_list[i]
-                if v < nbv:
-                    mwis.add(v)
-                    nb_is = nb_is.union(set(nb_set))
-            else:
-                pass
-        remain = remain - mwis - nb_is
-    total_ws = np.sum(wts[list(mwis)])
-    return mwis, total_ws
+    solu = np.flatnonzero(local_greedy_kernel(adj, wts)[0])
+    return set(solu.tolist()), np.sum(wts[solu])
 
 
 def local_greedy_search_count(adj, wts):
@@ -124,40 +289,9 @@ def local_greedy_search_count(adj, wts):
     :return: mwis, total_wt, step
     '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    remain = set(verts.flatten())
-    vidx = list(remain)
-    nb_is = set()
-    step = 0
-    while len(remain) > 0:
-        for v in remain:
-            # if v in nb_is:
-            #     continue
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            if len(nb_set) == 0:
-                mwis.add(v)
-                continue
-            nb_list = list(nb_set)
-            nb_list.sort()
-            wts_nb = wts[nb_list]
-            w_bar_v = wts_nb.max()
-            if wts[v] > w_bar_v:
-                mwis.add(v)
-                nb_is = nb_is.union(set(nb_set))
-            elif wts[v] == w_bar_v:
-                i = list(wts_nb).index(wts[v])
-                nbv = nb_list[i]
-                if v < nbv:
-                    mwis.add(v)
-                    nb_is = nb_is.union(set(nb_set))
-            else:
-                pass
-        remain = remain - mwis - nb_is
-        step += 1
-    total_ws = np.sum(wts[list(mwis)])
-    return mwis, total_ws, step
+    mwis, info = local_greedy_kernel(adj, wts, LGS_ROUNDS)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), np.sum(wts[solu]), info['rounds']
 
 
 def local_greedy_search_stats(adj, wts):
@@ -165,48 +299,12 @@ def local_greedy_search_stats(adj, wts):
     Return MWIS set and the total weights of MWIS and steps it takes
     :param adj: adjacency matrix (sparse)
     :param wts: weights of vertices
-    :return: mwis, total_wt, step
+    :return: mwis, total_wt, step, p2p, bst
     '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    remain = set(verts.flatten())
-    vidx = list(remain)
-    nb_is = set()
-    step = 0
-    p2p = 0
-    bst = 0
-    while len(remain) > 0:
-        bst += len(remain)
-        for v in remain:
-            # if v in nb_is:
-            #     continue
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            p2p += len(nb_set)
-            if len(nb_set) == 0:
-                mwis.add(v)
-                continue
-            nb_list = list(nb_set)
-            nb_list.sort()
-            wts_nb = wts[nb_list]
-            w_bar_v = wts_nb.max()
-            if wts[v] > w_bar_v:
-                mwis.add(v)
-                nb_is = nb_is.union(set(nb_set))
-            elif wts[v] == w_bar_v:
-                i = list(wts_nb).index(wts[v])
-                nbv = nb_list[i]
-                if v < nbv:
-                    mwis.add(v)
-                    nb_is = nb_is.union(set(nb_set))
-            else:
-                pass
-        remain = remain - mwis - nb_is
-        step += 1
-    total_ws = np.sum(wts[list(mwis)])
-    bst += len(list(mwis))
-    return mwis, total_ws, step, p2p, bst
+    mwis, info = local_greedy_kernel(adj, wts, LGS_ROUNDS | LGS_P2P | LGS_BROADCAST)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), np.sum(wts[solu]), info['rounds'], info['p2p'], info['bst']
 
 
 def local_greedy_search_overhead(adj, wts):
@@ -214,53 +312,14 @@ def local_greedy_search_overhead(adj, wts):
     Return MWIS set and the total weights of MWIS and steps it takes
     :param adj: adjacency matrix (sparse)
     :param wts: weights of vertices
-    :return: mwis, total_wt, step
+    :return: mwis, total_wt, step, p2p, bst, oh_vec
     '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    overheads = {}
+    mwis, info = local_greedy_kernel(adj, wts, LGS_ROUNDS | LGS_P2P | LGS_BROADCAST | LGS_OVERHEAD)
+    solu = np.flatnonzero(mwis)
     oh_vec = np.zeros_like(wts)
-    remain = set(verts.flatten())
-    vidx = list(remain)
-    nb_is = set()
-    step = 0
-    p2p = 0
-    bst = 0
-    while len(remain) > 0:
-        bst += len(remain)
-        for v in remain:
-            # if v in nb_is:
-            #     continue
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            p2p += len(nb_set)
-            oh_vec[v] += len(nb_set)
-            if len(nb_set) == 0:
-                mwis.add(v)
-                continue
-            nb_list = list(nb_set)
-            nb_list.sort()
-            wts_nb = wts[nb_list]
-            w_bar_v = wts_nb.max()
-            if wts[v] > w_bar_v:
-                mwis.add(v)
-                nb_is = nb_is.union(set(nb_set))
-                oh_vec[v] += 1 # mute signaling
-            elif wts[v] == w_bar_v:
-                i = list(wts_nb).index(wts[v])
-                nbv = nb_list[i]
-                if v < nbv:
-                    mwis.add(v)
-                    nb_is = nb_is.union(set(nb_set))
-                    oh_vec[v] += 1  # mute signaling
-            else:
-                pass
-        remain = remain - mwis - nb_is
-        step += 1
-    total_ws = np.sum(wts[list(mwis)])
-    bst += len(list(mwis))
-    return mwis, total_ws, step, p2p, bst, oh_vec
+    oh_vec += info['overhead']
+    return set(solu.tolist()), np.sum(wts[solu]), info['rounds'], info['p2p'], info['bst'], oh_vec
 
 
 def local_greedy_search_nstep(adj, wts, nstep=1):
@@ -268,50 +327,209 @@ def local_greedy_search_nstep(adj, wts, nstep=1):
     Return MWIS set and the total weights of MWIS
     :param adj: adjacency matrix (sparse)
     :param wts: weights of vertices
-    :return: mwis, total_wt
+    :param nstep: number of rounds to run, a negative value runs to completion
+    :return: mwis, total_wt, nb_is
     '''
     wts = np.array(wts).flatten()
-    verts = np.array(range(wts.size))
-    mwis = set()
-    remain = set(verts.flatten())
-    vidx = list(remain)
-    nb_is = set()
-    step = nstep
-    while len(remain) > 0 and step:
-        for v in remain:
-            _, nb_set = np.nonzero(adj[v])
-            nb_set = set(nb_set).intersection(remain)
-            if len(nb_set) == 0:
-                mwis.add(v)
+    mwis, info = local_greedy_kernel(adj, wts, max_rounds=nstep if nstep >= 0 else None)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), np.sum(wts[solu]), set(np.flatnonzero(info['nb_is']).tolist())
+
+
+def _dist_greedy_rounds(cg, wts, alpha, stats=0):
+    '''
+    Rounds of the distributed threshold greedy on CSR arrays
+    :param cg: ConflictGraph
+    :param wts: weights of vertices
+    :param alpha: a vertex is a candidate if its weight is at least 1/alpha of its heaviest remaining neighbour
+    :param stats: mask of LGS_P2P, LGS_BROADCAST counters to collect, rounds are always counted
+    :return: boolean indicator of the MWIS, dict of counters
+    '''
+    n = cg.n
+    src = cg.src
+    dst = cg.indices
+    remain = np.ones(n, dtype=bool)
+    mwis = np.zeros(n, dtype=bool)
+    nb_max = np.empty(n)
+    has_nb = np.empty(n, dtype=bool)
+    # candidates resolve conflicts in ascending index order
+    index_prio = np.arange(n - 1, -1, -1)
+    info = {'rounds': 0}
+    if stats & LGS_P2P:
+        info['p2p'] = 0
+    if stats & LGS_BROADCAST:
+        info['bst'] = 0
+    while np.any(remain):
+        has_nb.fill(False)
+        if src.size > 0:
+            heads = np.flatnonzero(np.concatenate(([True], src[1:] != src[:-1])))
+            nb_max[src[heads]] = np.maximum.reduceat(wts[dst], heads)
+            has_nb[src[heads]] = True
+        seta = remain & ~has_nb
+        seta[has_nb] = wts[has_nb] >= nb_max[has_nb] / alpha
+        if stats & LGS_P2P:
+            info['p2p'] += src.size
+        if stats & LGS_BROADCAST:
+            info['bst'] += int(np.count_nonzero(remain))
+        both = seta[src] & seta[dst]
+        mis_i = _lgs_rounds(src[both], dst[both], index_prio)[0] & seta
+        mwis |= mis_i
+        remain &= ~mis_i
+        remain[dst[mis_i[src]]] = False
+        active = remain[src] & remain[dst]
+        src = src[active]
+        dst = dst[active]
+        info['rounds'] += 1
+    if stats & LGS_BROADCAST:
+        info['bst'] += int(np.count_nonzero(mwis))
+    return mwis, info
+
+
+def dist_greedy_search(adj, wts, epislon=0.5):
+    '''
+    Return MWIS set and the total weights of MWIS
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param epislon: 0<epislon<1, to determin alpha and beta
+    :return: mwis, total_wt
+    '''
+    cg = as_conflict_graph(adj)
+    alpha = 1.0 + (epislon / 3.0)
+    wts = np.array(wts, dtype=float).flatten()
+    solu = np.flatnonzero(_dist_greedy_rounds(cg, wts, alpha)[0])
+    return set(solu.tolist()), np.sum(wts[solu])
+
+
+def dist_greedy_search_stats(adj, wts, epislon=0.5):
+    '''
+    Return MWIS set and the total weights of MWIS and steps it takes
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param epislon: 0<epislon<1, to determin alpha and beta
+    :return: mwis, total_wt, step, p2p, bst
+    '''
+    cg = as_conflict_graph(adj)
+    alpha = 1.0 + (epislon / 3.0)
+    wts = np.array(wts, dtype=float).flatten()
+    mwis, info = _dist_greedy_rounds(cg, wts, alpha, LGS_P2P | LGS_BROADCAST)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), np.sum(wts[solu]), info['rounds'], info['p2p'], info['bst']
+
+
+def _tile_edges(cg, batch):
+    '''
+    Edges of batch disjoint copies of a conflict graph, copy b uses vertices b*n ... b*n+n-1
+    :param cg: ConflictGraph
+    :param batch: number of copies
+    :return: src, dst
+    '''
+    offsets = np.arange(batch, dtype=np.int64)[:, None] * cg.n
+    src = (cg.src[None, :] + offsets).ravel()
+    dst = (cg.indices[None, :] + offsets).ravel()
+    return src, dst
+
+
+def local_greedy_search_batch(adj, wts_mtx):
+    '''
+    Return the LGS schedules of many weight vectors on one topology
+    :param adj: adjacency matrix (sparse)
+    :param wts_mtx: weights of vertices, one weight vector per row, shape (B, n)
+    :return: boolean schedules, shape (B, n)
+    '''
+    cg = as_conflict_graph(adj)
+    wts_mtx = np.array(wts_mtx, dtype=float).reshape(-1, cg.n)
+    prio = _batch_priority(np.argsort(-wts_mtx, axis=1, kind='stable'))
+    src, dst = _tile_edges(cg, wts_mtx.shape[0])
+    mwis, _ = _lgs_rounds(src, dst, prio.ravel())
+    return mwis.reshape(wts_mtx.shape)
+
+
+def greedy_search_batch(adj, wts_mtx):
+    '''
+    Return the greedy schedules of many weight vectors on one topology
+    :param adj: adjacency matrix (sparse)
+    :param wts_mtx: weights of vertices, one weight vector per row, shape (B, n)
+    :return: boolean schedules, shape (B, n)
+    '''
+    cg = as_conflict_graph(adj)
+    wts_mtx = np.array(wts_mtx, dtype=float).reshape(-1, cg.n)
+    orders = np.argsort(-wts_mtx, axis=1)
+    if njit is not None:
+        return _greedy_sweep(cg.indptr, cg.indices, orders)
+    # a local greedy search over the same strict vertex order selects the same set
+    src, dst = _tile_edges(cg, wts_mtx.shape[0])
+    mwis, _ = _lgs_rounds(src, dst, _batch_priority(orders).ravel())
+    return mwis.reshape(wts_mtx.shape)
+
+
+class IncrementalLGS(object):
+    """
+    Local greedy scheduler warm-started from the previous timeslot.
+    Only vertices whose weight changed and their neighbours are re-decided, and a status change
+    is pushed on to the lower-ranked neighbours, in descending (weight, -index) order, so the
+    schedule is identical to local_greedy_search from scratch.
+    """
+    def __init__(self, adj, rebuild_ratio=0.25):
+        self.cg = as_conflict_graph(adj)
+        self.rebuild_ratio = rebuild_ratio
+        self.wts = None
+        self.mwis = None
+
+    def reset(self):
+        self.wts = None
+        self.mwis = None
+
+    def _rebuild(self, wts):
+        self.mwis, _ = _lgs_rounds(self.cg.src, self.cg.indices, lgs_priority(wts))
+
+    def _repair(self, wts, changed):
+        cg = self.cg
+        mwis = self.mwis
+        dirty = np.unique(np.concatenate([changed] + [cg.neighbors(v) for v in changed]))
+        heap = [(-wts[v], v) for v in dirty.tolist()]
+        heapq.heapify(heap)
+        done = set()
+        while heap:
+            _, v = heapq.heappop(heap)
+            if v in done:
                 continue
-            nb_list = list(nb_set)
-            nb_list.sort()
-            wts_nb = wts[nb_list]
-            w_bar_v = wts_nb.max()
-            if wts[v] > w_bar_v:
-                mwis.add(v)
-                nb_is = nb_is.union(set(nb_set))
-            elif wts[v] == w_bar_v:
-                i = list(wts_nb).index(wts[v])
-                nbv = nb_list[i]
-                if v < nbv:
-                    mwis.add(v)
-                    nb_is = nb_is.union(set(nb_set))
-            else:
-                pass
-        remain = remain - mwis - nb_is
-        step -= 1
-    total_ws = np.sum(wts[list(mwis)])
-    return mwis, total_ws, nb_is
+            done.add(v)
+            nb_set = cg.neighbors(v)
+            higher = (wts[nb_set] > wts[v]) | ((wts[nb_set] == wts[v]) & (nb_set < v))
+            status = not np.any(mwis[nb_set[higher]])
+            if status != mwis[v]:
+                mwis[v] = status
+                for u in nb_set[~higher].tolist():
+                    heapq.heappush(heap, (-wts[u], u))
+
+    def schedule(self, wts):
+        '''
+        Return MWIS set and the total weights of MWIS for the weights of the current timeslot
+        :param wts: weights of vertices
+        :return: mwis, total_wt
+        '''
+        wts = np.array(wts, dtype=float).flatten()
+        if self.wts is None:
+            self._rebuild(wts)
+        else:
+            changed = np.flatnonzero(wts != self.wts)
+            if changed.size > self.rebuild_ratio * wts.size:
+                self._rebuild(wts)
+            elif changed.size > 0:
+                self._repair(wts, changed)
+        self.wts = wts
+        solu = np.flatnonzero(self.mwis)
+        return set(solu.tolist()), np.sum(wts[solu])
 
 
 def get_all_mis(adj):
     # G = ig.Graph()
     # G.Read_Adjacency(adj)
-    g2 = ig.Graph.Adjacency(adj)
+    cg = as_conflict_graph(adj)
+    g2 = ig.Graph(n=cg.n, edges=cg.edges.tolist())
     # assert G.get_adjacency() == g2.get_adjacency()
     mis_all1 = g2.maximal_independent_vertex_sets()
-    mis_all = np.zeros((len(adj), len(mis_all1)))
+    mis_all = np.zeros((cg.n, len(mis_all1)))
     for i in range(len(mis_all1)):
         mis_all[mis_all1[i],i] = 1
     return mis_all
@@ -324,24 +542,141 @@ def get_mwis(mis_all, wts):
     return np.nonzero(mis_all[:, idx])[0], utilities[idx]
 
 
+def _bits_to_mask(bits, n):
+    nbytes = (n + 7) // 8
+    return np.unpackbits(np.frombuffer(bits.to_bytes(nbytes, 'little'), dtype=np.uint8), bitorder='little')[:n].astype(bool)
+
+
+def _iter_mis_bits(cg, wts_mtx=None, best=None):
+    '''
+    Bron-Kerbosch with pivoting over the complement graph, yields maximal independent sets as vertex bitmasks
+    With weights, a branch is skipped when no weight vector can beat best (read at every branch, updated by the caller).
+    :param cg: ConflictGraph
+    :param wts_mtx: weights of vertices, shape (B, n), None to enumerate every set
+    :param best: best total weight found so far per weight vector, shape (B,)
+    '''
+    n = cg.n
+    closed = [1 << v for v in range(n)]
+    for u, v in cg.edges.tolist():
+        closed[u] |= 1 << v
+        closed[v] |= 1 << u
+    # candidates are popped from the end, heaviest (summed over weight vectors) first
+    order = list(range(n))
+    if wts_mtx is not None:
+        wts_pos = np.maximum(wts_mtx, 0)
+        order = np.argsort(wts_pos.sum(axis=0), kind='stable').tolist()
+
+    def branch(P, X):
+        # pivot u leaves the fewest candidates in P & N[u]
+        u = min((x for x in range(n) if (P | X) >> x & 1), key=lambda x: bin(P & closed[x]).count('1'))
+        rest = P & closed[u]
+        return [x for x in order if rest >> x & 1]
+
+    full = (1 << n) - 1
+    if n == 0:
+        return
+    zero = None if wts_mtx is None else np.zeros(wts_mtx.shape[0])
+    stack = [[0, full, 0, zero, branch(full, 0)]]
+    while stack:
+        frame = stack[-1]
+        R, P, X, wt_r, cands = frame
+        if not cands:
+            stack.pop()
+            continue
+        v = cands.pop()
+        frame[1] = P & ~(1 << v)
+        frame[2] = X | 1 << v
+        new_r = R | 1 << v
+        new_p = P & ~closed[v]
+        new_x = X & ~closed[v]
+        if new_p == 0:
+            if new_x == 0:
+                yield new_r
+            continue
+        new_wt = None
+        if wts_mtx is not None:
+            new_wt = wt_r + wts_mtx[:, v]
+            if np.all(new_wt + wts_pos @ _bits_to_mask(new_p, n) <= best):
+                continue
+        stack.append([new_r, new_p, new_x, new_wt, branch(new_p, new_x)])
+
+
+def iter_mis(adj, chunk_size=1024, max_bytes=None):
+    '''
+    Stream the maximal independent sets of a graph
+    :param adj: adjacency matrix (sparse)
+    :param chunk_size: number of sets per chunk
+    :param max_bytes: cap on the size of a chunk, lowers chunk_size to fit
+    :return: generator of boolean arrays, shape (sets, n)
+    '''
+    cg = as_conflict_graph(adj)
+    if max_bytes is not None:
+        chunk_size = max(1, min(chunk_size, max_bytes // max(cg.n, 1)))
+    chunk = []
+    for bits in _iter_mis_bits(cg):
+        chunk.append(_bits_to_mask(bits, cg.n))
+        if len(chunk) == chunk_size:
+            yield np.array(chunk)
+            chunk = []
+    if chunk:
+        yield np.array(chunk)
+
+
+def mwis_enumerate(adj, wts_mtx, chunk_size=1024, max_bytes=None, prune=True):
+    '''
+    Exact MWIS of many weight vectors by streaming the maximal independent sets, keeping the best set per vector
+    :param adj: adjacency matrix (sparse)
+    :param wts_mtx: weights of vertices, shape (n,) or (B, n)
+    :param chunk_size: number of sets scored at once
+    :param max_bytes: cap on the size of a chunk, lowers chunk_size to fit
+    :param prune: skip branches whose weight bound cannot beat the best set of any weight vector
+    :return: boolean MWIS per weight vector, shape (B, n), and their total weights, shape (B,)
+    '''
+    cg = as_conflict_graph(adj)
+    wts_mtx = np.atleast_2d(np.array(wts_mtx, dtype=float))
+    batch, n = wts_mtx.shape
+    if max_bytes is not None:
+        chunk_size = max(1, min(chunk_size, max_bytes // max(n, 1)))
+    # greedy schedules are maximal independent sets, they seed the bound
+    mwis = greedy_search_batch(cg, wts_mtx)
+    best = np.sum(wts_mtx * mwis, axis=1)
+    sets = _iter_mis_bits(cg, wts_mtx if prune else None, best)
+    chunk = []
+
+    def score(chunk):
+        masks = np.array(chunk)
+        totals = wts_mtx @ masks.T
+        idx = np.argmax(totals, axis=1)
+        better = totals[np.arange(batch), idx] > best
+        # update in place, the pruning bound reads the same array
+        best[better] = totals[better, idx[better]]
+        mwis[better] = masks[idx[better]]
+
+    for bits in sets:
+        chunk.append(_bits_to_mask(bits, n))
+        if len(chunk) == chunk_size:
+            score(chunk)
+            chunk = []
+    if chunk:
+        score(chunk)
+    return mwis, best
+
+
 def mlp_gurobi(adj, wts, timeout=300):
+    cg = as_conflict_graph(adj)
     wts = np.array(wts).flatten()
     opt_model = plp.LpProblem(name="MIP_Model")
     x_vars = {i: plp.LpVariable(cat=plp.LpBinary, name="x_{0}".format(i)) for i in range(wts.size)}
     set_V = set(range(wts.size))
     constraints = {}
-    ei = 0
-    for j in set_V:
-        _, set_N = np.nonzero(adj[j])
-        # print(set_N)
-        for i in set_N:
-            constraints[ei] = opt_model.addConstraint(
-                plp.LpConstraint(
-                    e=plp.lpSum([x_vars[i], x_vars[j]]),
-                    sense=plp.LpConstraintLE,
-                    rhs=1,
-                    name="constraint_{0}_{1}".format(j,i)))
-            ei += 1
+    # one constraint per undirected edge
+    for ei, (i, j) in enumerate(cg.edges.tolist()):
+        constraints[ei] = opt_model.addConstraint(
+            plp.LpConstraint(
+                e=plp.lpSum([x_vars[i], x_vars[j]]),
+                sense=plp.LpConstraintLE,
+                rhs=1,
+                name="constraint_{0}_{1}".format(i, j)))
     objective = plp.lpSum(x_vars[i] * wts[i] for i in set_V )
     opt_model.sense = plp.LpMaximize
     opt_model.setObjective(objective)
@@ -349,273 +684,488 @@ def mlp_gurobi(adj, wts, timeout=300):
                                            timeLimit=timeout*1.1,
                                            # NodeLimit=35000,
                                            ImproveStartTime=timeout))
-    opt_df = pd.DataFrame.from_dict(x_vars, orient="index", columns=["variable_object"])
-    opt_df["solution_value"] = opt_df["variable_object"].apply(lambda item: item.varValue)
-    solu = opt_df[opt_df['solution_value'] > 0].index.to_numpy()
+    solu = np.array([i for i in range(wts.size) if (x_vars[i].varValue or 0) > 0], dtype=np.int64)
     return solu, wts[solu].sum(), plp.LpStatus[opt_model.status]
 
 
-def gradient_projection(adj, wts, ita=1.0):
-    adj_theta0 = adj.astype(float).copy()
-    cf0, cf1 = adj_theta0.nonzero()
-    D = np.amax(adj.sum(1))
-    nE = cf0.size
-    discount = ita/(D*np.sqrt(nE))
-    for i in range(cf0.size):
-        adj_theta0[cf0[i], cf1[i]] = np.amax([wts[cf0[i]], wts[cf1[i]]])
-    vec_relax = np.zeros(wts.shape)
-    for i in range(wts.size):
-        pts = adj_theta0[i,:].sum() - wts[i]
-        if pts > ita:
-            vec_relax[i] = ita/pts
+def conflict_incidence(adj, cover='edge'):
+    '''
+    Constraint matrix of the independent set polytope, one row per edge or clique
+    :param adj: adjacency matrix (sparse)
+    :param cover: 'edge' for the undirected edges, 'clique' for the maximal cliques, 'clique_cover' for a greedy
+                  edge clique cover, cliques are cached per topology
+    :return: incidence matrix (scipy.sparse.csr_matrix), shape (rows, n)
+    '''
+    cg = as_conflict_graph(adj)
+    if cover == 'edge':
+        m = cg.edges.shape[0]
+        rows = np.repeat(np.arange(m), 2)
+        return sp.csr_matrix((np.ones(rows.size), (rows, cg.edges.ravel())), shape=(m, cg.n))
+    elif cover == 'clique':
+        return clique_incidence(cg, 'maximal')
+    elif cover == 'clique_cover':
+        return clique_incidence(cg, 'greedy')
+    else:
+        raise ValueError("unknown cover: {}".format(cover))
+
+
+def _mwis_milp(cg, wts, timeout, cover='edge'):
+    '''
+    Exact MWIS with the HiGHS branch-and-cut of scipy.optimize.milp
+    '''
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    options = {} if timeout is None else {'time_limit': timeout}
+    incidence = conflict_incidence(cg, cover)
+    constraints = []
+    if incidence.shape[0] > 0:
+        constraints = [LinearConstraint(incidence, -np.inf, 1.0)]
+    res = milp(-wts, constraints=constraints, integrality=np.ones(cg.n), bounds=Bounds(0, 1), options=options)
+    if res.x is None:
+        return np.zeros(cg.n, dtype=bool), {'status': res.message, 'nodes': 0, 'bound': np.inf}
+    info = {'status': 'Optimal' if res.status == 0 else res.message,
+            'nodes': int(getattr(res, 'mip_node_count', 0)),
+            'bound': -getattr(res, 'mip_dual_bound', res.fun)}
+    return res.x > 0.5, info
+
+
+def _clique_cover_bound(nbrs, wts, order, cand):
+    '''
+    Upper bound on the MWIS weight of the vertices in bitmask cand, sum of the heaviest vertex of a greedy clique cover
+    '''
+    cliques = []
+    bound = 0.0
+    for v in order:
+        if not cand >> v & 1:
+            continue
+        for k in range(len(cliques)):
+            if cliques[k] & ~nbrs[v] == 0:
+                cliques[k] |= 1 << v
+                break
         else:
-            vec_relax[i] = 1.0
-    while True:
-        adj_theta1 = adj_theta0.copy()
-        for j in range(wts.size):
-            cf0, cf1 = adj_theta1.nonzero()
-            for i in range(cf0.size):
-                adj_theta1[cf0[i], cf1[i]] = adj_theta0[cf0[i], cf1[i]] - discount*(1 - vec_relax[cf0[i]] - vec_relax[cf1[i]])
-            pts = adj_theta1[j, :].sum() - wts[j]
-            if pts > ita:
-                vec_relax[j] = ita/pts
-            else:
-                vec_relax[j] = 1.0
-        delta = np.amax(np.abs(adj_theta0 - adj_theta1))
-        if delta < 0.001:
-            break
-        adj_theta0 = adj_theta1.copy()
+            # order is by descending weight, the first vertex of a clique is its heaviest
+            cliques.append(1 << v)
+            bound += wts[v]
+    return bound
+
+
+def _mwis_bnb(cg, wts, timeout):
+    '''
+    Exact MWIS by branch-and-bound on vertex bitmasks for small graphs
+    Every node applies the non-positive weight, isolated vertex, pendant vertex and weighted dominance reductions,
+    prunes on a greedy clique cover bound and branches on the heaviest remaining vertex.
+    '''
+    n = cg.n
+    w = wts.tolist()
+    nbrs = [0] * n
+    for u, v in cg.edges.tolist():
+        nbrs[u] |= 1 << v
+        nbrs[v] |= 1 << u
+    order = np.argsort(-wts, kind='stable').tolist()
+    init = greedy_search(cg, np.maximum(wts, 0))[0]
+    best = {'wt': float(sum(w[v] for v in init if w[v] > 0)), 'set': sum(1 << v for v in init if w[v] > 0)}
+    t_start = time.time()
+    stats = {'nodes': 0, 'timeout': False}
+
+    def reduce(cand, cur_wt, cur_set):
+        changed = True
+        while changed:
+            changed = False
+            for v in order:
+                if not cand >> v & 1:
+                    continue
+                nv = nbrs[v] & cand
+                if w[v] <= 0:
+                    cand &= ~(1 << v)
+                    changed = True
+                elif nv == 0:
+                    cand &= ~(1 << v)
+                    cur_wt += w[v]
+                    cur_set |= 1 << v
+                    changed = True
+                elif nv & (nv - 1) == 0 and w[v] >= w[nv.bit_length() - 1]:
+                    # pendant vertex at least as heavy as its neighbour
+                    cand &= ~(nv | 1 << v)
+                    cur_wt += w[v]
+                    cur_set |= 1 << v
+                    changed = True
+                else:
+                    # v dominates a neighbour u whose closed neighbourhood contains that of v
+                    closed_v = nv | 1 << v
+                    rest = nv
+                    while rest:
+                        u = (rest & -rest).bit_length() - 1
+                        rest &= rest - 1
+                        if w[v] >= w[u] and closed_v & ~(nbrs[u] | 1 << u) == 0:
+                            cand &= ~(1 << u)
+                            changed = True
+                if changed:
+                    break
+        return cand, cur_wt, cur_set
+
+    def search(cand, cur_wt, cur_set):
+        if timeout is not None and time.time() - t_start > timeout:
+            stats['timeout'] = True
+            return
+        stats['nodes'] += 1
+        cand, cur_wt, cur_set = reduce(cand, cur_wt, cur_set)
+        if cand == 0:
+            if cur_wt > best['wt']:
+                best['wt'] = cur_wt
+                best['set'] = cur_set
+            return
+        if cur_wt + _clique_cover_bound(nbrs, w, order, cand) <= best['wt']:
+            return
+        v = next(u for u in order if cand >> u & 1)
+        search(cand & ~(nbrs[v] | 1 << v), cur_wt + w[v], cur_set | 1 << v)
+        search(cand & ~(1 << v), cur_wt, cur_set)
+
+    root = reduce((1 << n) - 1, 0.0, 0)
+    bound = root[1] + _clique_cover_bound(nbrs, w, order, root[0])
+    search(*root)
+    mwis = np.array([best['set'] >> v & 1 for v in range(n)], dtype=bool)
+    if stats['timeout']:
+        status = 'Time limit reached'
+    else:
+        status = 'Optimal'
+        bound = best['wt']
+    return mwis, {'status': status, 'nodes': stats['nodes'], 'bound': bound}
+
+
+def _mwis_gurobi(cg, wts, timeout):
+    solu, _, status = mlp_gurobi(cg, wts, 300 if timeout is None else timeout)
+    mwis = np.zeros(cg.n, dtype=bool)
+    mwis[solu] = True
+    return mwis, {'status': status, 'nodes': None, 'bound': None}
+
+
+# exact MWIS backends, solver(cg, wts, timeout, **kwargs) -> boolean indicator of the MWIS, info
+MWIS_SOLVERS = {
+    'milp': _mwis_milp,
+    'bnb': _mwis_bnb,
+    'gurobi': _mwis_gurobi,
+}
+
+
+def mwis_exact(adj, wts, solver='milp', timeout=300, reduce=False, **kwargs):
+    '''
+    Return the maximum weighted independent set from an exact solver
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param solver: key of MWIS_SOLVERS, 'milp' (HiGHS), 'bnb' (native, small graphs) or 'gurobi'
+    :param timeout: time limit in seconds, None for no limit
+    :param reduce: solve the residual graph of reduce_graph and lift its solution
+    :param kwargs: options of the solver, e.g. cover='clique' for 'milp'
+    :return: mwis, total_wt, info with status, time, nodes, bound, relative gap and solved vertices
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts, dtype=float).flatten()
+    t0 = time.time()
+    if reduce:
+        red = reduce_graph(cg, wts)
+        if red.residual.n > 0:
+            mwis, info = MWIS_SOLVERS[solver](red.residual, red.weights, timeout, **kwargs)
+        else:
+            mwis, info = np.zeros(0, dtype=bool), {'status': 'Optimal', 'nodes': 0, 'bound': 0.0}
+        solu = red.lift(np.flatnonzero(mwis))
+        if info['bound'] is not None:
+            info['bound'] += red.offset
+        info['kernel'] = red.residual.n
+    else:
+        mwis, info = MWIS_SOLVERS[solver](cg, wts, timeout, **kwargs)
+        solu = np.flatnonzero(mwis)
+        info['kernel'] = cg.n
+    info['time'] = time.time() - t0
+    total_wt = np.sum(wts[solu])
+    if info['bound'] is None:
+        info['gap'] = None
+    else:
+        info['gap'] = max(info['bound'] - total_wt, 0.0) / max(abs(total_wt), 1e-12)
+    return solu, total_wt, info
+
+
+def gradient_projection(adj, wts, ita=1.0, max_iter=1000, tol=0.001, trace=False):
+    '''
+    Relaxed MWIS by gradient steps on edge prices theta, one value per CSR entry of the conflict graph
+    Every iteration updates all vertices at once (Jacobi) from the row sums of theta, then moves theta.
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param ita: step size and price threshold
+    :param max_iter: iteration cap
+    :param tol: stop when no edge price moves by tol or more
+    :param trace: also return the largest price move of every iteration
+    :return: vec_relax, and the trace array if trace is set
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts, dtype=float).flatten()
+    src, dst = cg.src, cg.indices
+    n = cg.n
+
+    def relax(theta):
+        pts = np.bincount(src, weights=theta, minlength=n) - wts
+        vec = np.ones(n)
+        over = pts > ita
+        vec[over] = ita / pts[over]
+        return vec
+
+    deltas = []
+    theta0 = np.maximum(wts[src], wts[dst])
+    vec_relax = relax(theta0)
+    if src.size > 0:
+        discount = ita / (np.amax(cg.degree) * np.sqrt(src.size))
+        for _ in range(max_iter):
+            vec_relax = relax(theta0 - discount * (1 - vec_relax[src] - vec_relax[dst]))
+            step = discount * (1 - vec_relax[src] - vec_relax[dst])
+            theta0 = theta0 - step
+            deltas.append(np.amax(np.abs(step)))
+            if deltas[-1] < tol:
+                break
+    if trace:
+        return vec_relax, np.array(deltas)
     return vec_relax
 
 
+def mwis_lp_relax(adj, wts, cover='edge'):
+    '''
+    LP relaxation of MWIS, max wts.x subject to the rows of conflict_incidence and 0 <= x <= 1, solved with HiGHS
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param cover: 'edge', 'clique' or 'clique_cover', see conflict_incidence
+    :return: primal x per vertex, dual price per constraint row
+    '''
+    from scipy.optimize import linprog
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts, dtype=float).flatten()
+    incidence = conflict_incidence(cg, cover)
+    if incidence.shape[0] == 0:
+        return (wts > 0).astype(float), np.zeros(0)
+    res = linprog(-wts, A_ub=incidence, b_ub=np.ones(incidence.shape[0]), bounds=(0, 1), method='highs')
+    if res.status != 0:
+        raise RuntimeError("LP relaxation failed: {}".format(res.message))
+    # marginals are of the minimization of -wts.x, dual prices of the maximization are their negation
+    return res.x, -res.ineqlin.marginals
+
+
 def mwis_mip_edge_relax(adj, wts):
-    wts = np.array(wts).flatten()
-    opt_model = plp.LpProblem(name="MIP_Model", sense=plp.LpMaximize)
-    x_vars = {i: plp.LpVariable(lowBound=0.0, upBound=1.0,  name="x_{0}".format(i)) for i in range(wts.size)}
-    set_V = set(range(wts.size))
-    constraints = {}
-    ei = 0
-    for j in set_V:
-        _, set_N = np.nonzero(adj[j])
-        for i in set_N:
-            constraints[ei] = opt_model.addConstraint(
-                plp.LpConstraint(
-                    e=plp.lpSum([x_vars[i], x_vars[j]]),
-                    sense=plp.LpConstraintLE,
-                    rhs=1,
-                    name="constraint_{0}_{1}".format(j, i)))
-            ei += 1
-
-    objective = plp.lpSum(x_vars[i] * wts[i] for i in set_V)
-    opt_model.setObjective(objective)
-    # opt_model.solve(solver=plp.apis.GUROBI(mip=False, msg=True))
-    opt_model.solve(solver=GLPK(msg=True))
-    opt_df = pd.DataFrame.from_dict(x_vars, orient="index", columns=["variable_object"])
-    opt_df["solution_value"] = opt_df["variable_object"].apply(lambda item: item.varValue)
-    solu_relax = opt_df['solution_value'].to_numpy()
-    return solu_relax
+    return mwis_lp_relax(adj, wts, 'edge')[0]
 
 
 def mwis_mip_clique_relax(adj, wts):
-    g = nx.from_scipy_sparse_matrix(adj)
-    max_cliques = list(nx.algorithms.clique.find_cliques(g))
-    opt_model = plp.LpProblem(name="MIP_Model", sense=plp.LpMaximize)
-    x_vars = {i: plp.LpVariable(lowBound=0.0, upBound=1.0,  name="x_{0}".format(i)) for i in range(wts.size)}
-    set_V = set(range(wts.size))
-    constraints = {}
-    ei = 0
-    for j in range(len(max_cliques)):
-        clique = max_cliques[j]
-        constraints[ei] = opt_model.addConstraint(
-            plp.LpConstraint(
-                e=plp.lpSum(x_vars[i] for i in clique),
-                sense=plp.LpConstraintLE,
-                rhs=1.0,
-                name="constraint_{0}".format(j)))
-        ei += 1
+    return mwis_lp_relax(adj, wts, 'clique')[0]
 
-    objective = plp.lpSum(x_vars[i] * wts[i] for i in set_V)
-    opt_model.setObjective(objective)
-    # opt_model.solve(solver=plp.apis.GUROBI(mip=False, msg=True))
-    opt_model.solve(solver=GLPK(msg=True))
-    opt_df = pd.DataFrame.from_dict(x_vars, orient="index", columns=["variable_object"])
-    opt_df["solution_value"] = opt_df["variable_object"].apply(lambda item: item.varValue)
-    solu_relax = opt_df['solution_value'].to_numpy()
-    return solu_relax
 
+def _nb_reduce(cg, ufunc, vals, fill):
+    '''
+    Reduce vals over the neighbours of every vertex, vertices without neighbours get fill
+    '''
+    out = np.full(cg.n, fill, dtype=vals.dtype)
+    nz = cg.degree > 0
+    out[nz] = ufunc.reduceat(vals, cg.indptr[:-1][nz])
+    return out
 
-def mp_greedy(adj, wts):
-    wts = np.array(wts).flatten()
-    solu_relax = mwis_mip_clique_relax(adj, wts)
-    print(solu_relax)
 
-    vec_x = np.full_like(wts, fill_value=np.nan)
+def _mp_greedy_rounds(cg, wts, solu_relax):
+    '''
+    Round-synchronous message passing that rounds the LP relaxation, every round reads the decisions of the last one
+    :return: boolean indicator of the MWIS, number of rounds
+    '''
+    n = cg.n
+    src, dst = cg.src, cg.indices
+    vec_x = np.full(n, np.nan)
     vec_x[solu_relax == 0.0] = 0
     vec_x[solu_relax == 1.0] = 1
-    N = wts.size
-    for n in range(N):
-        vec_x1 = vec_x.copy()
-        Vi = np.argwhere(np.isnan(vec_x1))
-        if Vi.size == 0:
+    nb_max = _nb_reduce(cg, np.maximum, wts[dst], -np.inf)
+    # lowest index among the heaviest neighbours
+    nb_first = _nb_reduce(cg, np.minimum, np.where(wts[dst] == nb_max[src], dst, n), n)
+    wins = (wts > nb_max) | ((wts == nb_max) & (np.arange(n) < nb_first))
+    rounds = 0
+    for _ in range(n):
+        undecided = np.isnan(vec_x)
+        if not np.any(undecided):
             break
-        for v in Vi:
-            neighbors = adj[v, :].toarray()[0, :].nonzero()[0]
-            vec_nb = vec_x1[neighbors]
-            if (vec_nb == 1.0).astype(float).sum() > 0:
-                vec_x[v] = 0
-            elif wts[v] > np.amax(wts[neighbors]):
-                vec_x[v] = 1
-            elif wts[v] == np.amax(wts[neighbors]):
-                vn = np.argmax(wts[neighbors])
-                if v < neighbors[vn]:
-                    vec_x[v] = 1
-            elif (vec_nb == 0.0).astype(int).sum() == neighbors.size:
-                vec_x[v] = 1
-            else:
-                pass
-        Vn = np.argwhere(np.isnan(vec_x))
-        if Vn.size == Vi.size:
-            v = np.argmax(wts[Vn])
-            vec_x[Vn[v]] = 1
-
-    solu = (vec_x == 1.0).astype(int).nonzero()[0]
-    return set(solu), wts[solu].sum()
+        rounds += 1
+        nb_one = np.bincount(src, weights=(vec_x[dst] == 1.0), minlength=n) > 0
+        nb_zero = np.bincount(src, weights=(vec_x[dst] == 0.0), minlength=n) == cg.degree
+        vec_x[undecided & nb_one] = 0
+        vec_x[undecided & ~nb_one & (wins | nb_zero)] = 1
+        still = np.isnan(vec_x)
+        if np.count_nonzero(still) == np.count_nonzero(undecided):
+            vn = np.flatnonzero(still)
+            vec_x[vn[np.argmax(wts[vn])]] = 1
+    return vec_x == 1.0, rounds
 
 
-def mwis_mip_edge_dual(adj, wts):
+def mp_greedy(adj, wts):
+    cg = as_conflict_graph(adj)
     wts = np.array(wts).flatten()
-    g = nx.from_scipy_sparse_matrix(adj)
-    max_cliques = list(nx.algorithms.clique.find_cliques(g))
-    opt_model = plp.LpProblem(name="MIP_Model", sense=plp.LpMinimize)
-    x0, x1 = adj.nonzero()
-    x_vars = {(x0[i], x1[i]): plp.LpVariable(lowBound=0.0, name="x_{0}_{1}".format(x0[i], x1[i])) for i in range(x0.size)}
-    constraints = {}
-    ei = 0
-    for v in range(wts.size):
-        neighbors = adj[v, :].toarray()[0, :].nonzero()[0]
-        constraints[ei] = opt_model.addConstraint(
-            plp.LpConstraint(
-                e=plp.lpSum(x_vars[(v,i)] for i in neighbors),
-                sense=plp.LpConstraintGE,
-                rhs=wts[v],
-                name="constraint_{0}".format(v)))
-        ei += 1
+    solu_relax = mwis_mip_clique_relax(cg, wts)
+    solu = np.flatnonzero(_mp_greedy_rounds(cg, wts, solu_relax)[0])
+    return set(solu.tolist()), wts[solu].sum()
 
-    objective = plp.lpSum(x_var for x_var in x_vars.values())
-    opt_model.setObjective(objective)
-    # opt_model.solve(solver=plp.apis.GUROBI(mip=False, msg=True))
-    opt_model.solve(solver=GLPK(msg=True))
-    opt_df = pd.DataFrame.from_dict(x_vars, orient="index", columns=["variable_object"])
-    opt_df["solution_value"] = opt_df["variable_object"].apply(lambda item: item.varValue)
-    opt_df["name"] = opt_df["variable_object"].apply(lambda item: item.name)
-    opt_df.set_index("name", inplace=True)
-    solu_relax = adj.copy().astype(float)
-    x0, x1 = solu_relax.nonzero()
-    for i in range(x0.size):
-        idx = 'x_{}_{}'.format(x0[i], x1[i])
-        solu_relax[x0[i], x1[i]] = opt_df.loc[idx, 'solution_value']
-    return solu_relax
 
+def mp_greedy_count(adj, wts):
+    '''
+    Return MWIS set and the total weights of MWIS and message-passing rounds it takes
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :return: mwis, total_wt, step
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts).flatten()
+    solu_relax = mwis_mip_clique_relax(cg, wts)
+    mwis, rounds = _mp_greedy_rounds(cg, wts, solu_relax)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), wts[solu].sum(), rounds
 
-def mp_color09(adj, wts, tao=0.0):
-    solu_relax = mwis_mip_edge_dual(adj, wts)
-
-    vec_x = np.full_like(wts, fill_value=np.nan)
-    vec_c = np.zeros(wts.shape) # 0: green, 1: gray, 2: orange, 3: red
-    for v in range(wts.size):
-        val = solu_relax[v,:].sum() - wts[v]
-        if val > tao:
-            vec_x[v] = 0
-            vec_c[v] = 1
+
+def mwis_mip_edge_dual(adj, wts):
+    '''
+    Edge prices of the dual of the edge LP relaxation, the HiGHS marginals of its edge constraints
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :return: symmetric sparse matrix with the price of edge (u, v) at [u, v] and [v, u]
+    '''
+    cg = as_conflict_graph(adj)
+    _, prices = mwis_lp_relax(cg, wts, 'edge')
+    u, v = cg.edges[:, 0], cg.edges[:, 1]
+    n = cg.n
+    return sp.csr_matrix((np.concatenate((prices, prices)), (np.concatenate((u, v)), np.concatenate((v, u)))), shape=(n, n))
+
+
+def _mp_color09_rounds(cg, wts, solu_relax, tao):
+    '''
+    Round-synchronous coloring on the edge dual prices: gray (out) when the prices over-cover the weight, orange (in)
+    next to a gray neighbour whose edge price exceeds tao, red (in) when still undecided at the end.
+    Orange candidates that are neighbours resolve in ascending index order.
+    Red vertices are not checked against their neighbours, the set is often not independent.
+    :return: boolean indicator of the scheduled vertices, number of rounds
+    '''
+    n = cg.n
+    src, dst = cg.src, cg.indices
+    # price of every CSR entry, fancy indexing a sparse matrix with no entries does not give an array
+    prices = np.zeros(src.size)
+    if src.size > 0:
+        prices[:] = np.asarray(sp.csr_matrix(solu_relax)[src, dst]).ravel()
+    index_prio = np.arange(n - 1, -1, -1)
+    vec_c = np.zeros(n, dtype=int) # 0: green, 1: gray, 2: orange, 3: red
+    vec_c[np.bincount(src, weights=prices, minlength=n) - wts > tao] = 1
+    rounds = 0
     while True:
-        Vi = np.argwhere(np.isnan(vec_x))
-        if Vi.size == 0:
+        undecided = vec_c == 0
+        if not np.any(undecided):
             break
-        for v in Vi:
-            neighbors = adj[v, :].toarray()[0, :].nonzero()[0]
-            graynodes = neighbors[vec_c[neighbors] == 1]
-            if graynodes.size > 0 and np.amax(solu_relax[v,graynodes]) > tao:
-                vec_x[v] = 1
-                vec_c[v] = 2
-            oragnodes = neighbors[vec_c[neighbors] == 2]
-            if oragnodes.size > 0:
-                vec_x[v] = 0
-                vec_c[v] = 1
-        Vn = np.argwhere(np.isnan(vec_x))
-        if Vn.size == Vi.size:
+        rounds += 1
+        gray_pull = np.bincount(src, weights=(vec_c[dst] == 1) & (prices > tao), minlength=n) > 0
+        nb_orange = np.bincount(src, weights=(vec_c[dst] == 2), minlength=n) > 0
+        cand = undecided & gray_pull & ~nb_orange
+        both = cand[src] & cand[dst]
+        orange = _lgs_rounds(src[both], dst[both], index_prio)[0] & cand
+        vec_c[orange] = 2
+        nb_orange = np.bincount(src, weights=(vec_c[dst] == 2), minlength=n) > 0
+        vec_c[undecided & ~orange & nb_orange] = 1
+        if np.count_nonzero(vec_c == 0) == np.count_nonzero(undecided):
             break
-    vec_x[vec_c==0] = 1
-    vec_c[vec_c==0] = 3
+    vec_c[vec_c == 0] = 3
+    return vec_c >= 2, rounds
 
-    solu = (vec_x==1.0).astype(int).nonzero()[0]
-    return set(solu), wts[solu].sum()
+
+def mp_color09(adj, wts, tao=0.0):
+    '''
+    Return the set colored orange or red and its total weight, the set can contain neighbours
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param tao: threshold on the edge prices
+    :return: mwis, total_wt
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts).flatten()
+    solu_relax = mwis_mip_edge_dual(cg, wts)
+    solu = np.flatnonzero(_mp_color09_rounds(cg, wts, solu_relax, tao)[0])
+    return set(solu.tolist()), wts[solu].sum()
+
+
+def mp_color09_count(adj, wts, tao=0.0):
+    '''
+    Return the set colored orange or red, its total weight and the message-passing rounds it takes,
+    the set can contain neighbours
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param tao: threshold on the edge prices
+    :return: mwis, total_wt, step
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts).flatten()
+    solu_relax = mwis_mip_edge_dual(cg, wts)
+    mwis, rounds = _mp_color09_rounds(cg, wts, solu_relax, tao)
+    solu = np.flatnonzero(mwis)
+    return set(solu.tolist()), wts[solu].sum(), rounds
 
 
-def mp_ising(adj, wts):
+def _ising_anneal(cg, wts, chains):
+    '''
+    Anneal independent spin chains, in every temperature step the marked spins that beat their neighbours flip at once
+    :param cg: ConflictGraph
+    :param wts: weights of vertices
+    :param chains: number of chains
+    :return: spins, shape (chains, n)
+    '''
     NT = 128
     e_max = 5.0
     e_min = -5.0
     e_step = abs(e_max-e_min)/NT
     N = wts.size
-    A = 10
-    B = A/3
+    src, dst = cg.src, cg.indices
+    nz = cg.degree > 0
+    heads = cg.indptr[:-1][nz]
     uni = np.array([-1,1], dtype=float)
-    spins = uni[np.random.randint(0, 2, size=wts.size)]
+    spins = uni[np.random.randint(0, 2, size=(chains, N))]
+    nb_rmax = np.full((chains, N), -np.inf)
     for e in np.arange(e_min, e_max+e_step, e_step):
         beta = 10.0**e
         flip = spins.copy()
-        # for v in range(N):
-        #     neighbors = adj[v, :].toarray()[0, :].nonzero()[0]
-        #     flipped = -flip[v]
-        #     H_diff = 2*A*np.sum(wts[neighbors] * flip[neighbors])*wts[v]*flipped - 2*B*wts[v]*flipped
-        #     if H_diff < 0:
-        #         spins[v] = flipped
-        #     elif np.random.uniform(0, 1) < np.exp(-beta * H_diff):
-        #         spins[v] = flipped
-        #     else:
-        #         pass
-        vec_r = np.random.uniform(0, 1, size=wts.size)
-        vec_m = (vec_r < 1/N).astype(float)
-        marked = np.nonzero(vec_m)[0]
-        for v in marked:
-            neighbors = adj[v, :].toarray()[0, :].nonzero()[0]
-            if np.sum(vec_m[neighbors]) == 0 or vec_r[v] > np.amax(vec_r[neighbors]):
-                flipped = abs(flip[v] - 1)
-                H_flip = np.sum(flipped*flip[neighbors])*N - (float(N/3))*(np.sum(wts[neighbors]*flip[neighbors]) + wts[v]*flipped)
-                H_prev = np.sum(flip[v]*flip[neighbors])*N - (float(N/3))*(np.sum(wts[neighbors]*flip[neighbors]) + wts[v]*flip[v])
-                H_diff = H_flip - H_prev
-                if H_diff < 0:
-                    spins[v] = flipped
-                elif np.random.uniform(0,1) < np.exp(-beta*H_diff):
-                    spins[v] = flipped
-                else:
-                    pass
-    # final check
-    solu0 = np.nonzero(spins)[0]
-    # indices = np.argsort(wts[solu0])
-    # solu0 = solu0[indices]
-    # while True:
-    #     adj_1 = adj.copy()
-    #     adj_1 = adj_1[solu0, :]
-    #     adj_1 = adj_1[:, solu0]
-    #     if adj_1.sum() == 0:
-    #         break
-    #     cf0, cf1 = adj_1.nonzero()
-    #     if wts[solu0[cf0[0]]] > wts[solu0[cf1[0]]]:
-    #         todel = cf1[0]
-    #     else:
-    #         todel = cf0[0]
-    #     solu0 = np.delete(solu0, todel)
-    wts_1 = wts[solu0]
-    adj_1 = adj.toarray()
-    adj_1 = adj_1[solu0, :]
-    adj_1 = adj_1[:, solu0]
-    adj_1 = sp.csr_matrix(adj_1)
-    solu1, util1 = greedy_search(adj_1, wts_1)
-    solu = solu0[list(solu1)]
-    return set(solu), wts[solu].sum()
+        vec_r = np.random.uniform(0, 1, size=(chains, N))
+        vec_m = vec_r < 1/N
+        nb_marked = cg.adj.dot(vec_m.T.astype(float)).T
+        if heads.size > 0:
+            nb_rmax[:, nz] = np.maximum.reduceat(vec_r[:, dst], heads, axis=1)
+        update = vec_m & ((nb_marked == 0) | (vec_r > nb_rmax))
+        if not np.any(update):
+            continue
+        flipped = np.abs(flip - 1)
+        nb_sum = cg.adj.dot(flip.T).T
+        nb_wsum = cg.adj.dot((wts[:, None] * flip.T)).T
+        H_flip = flipped*nb_sum*N - (float(N/3))*(nb_wsum + wts*flipped)
+        H_prev = flip*nb_sum*N - (float(N/3))*(nb_wsum + wts*flip)
+        H_diff = H_flip - H_prev
+        accept = update & (H_diff < 0)
+        # uphill moves draw their Metropolis test in row-major order
+        uphill = update & ~accept
+        accept[uphill] = np.random.uniform(0, 1, size=np.count_nonzero(uphill)) < np.exp(-beta*H_diff[uphill])
+        spins[accept] = flipped[accept]
+    return spins
 
 
+def mp_ising(adj, wts, chains=1):
+    '''
+    Return MWIS set and the total weights of MWIS from Ising annealing followed by a greedy repair
+    :param adj: adjacency matrix (sparse)
+    :param wts: weights of vertices
+    :param chains: number of independent annealing chains, the heaviest repaired set is returned
+    :return: mwis, total_wt
+    '''
+    cg = as_conflict_graph(adj)
+    wts = np.array(wts).flatten()
+    spins = _ising_anneal(cg, wts, chains)
+    best = None
+    for c in range(chains):
+        # final check, greedy on the subgraph of the nonzero spins
+        solu0 = np.nonzero(spins[c])[0]
+        adj_1 = cg.adj[solu0][:, solu0]
+        solu1, util1 = greedy_search(adj_1, wts[solu0])
+        solu = solu0[list(solu1)]
+        if best is None or wts[solu].sum() > wts[best].sum():
+            best = solu
+    return set(best.tolist()), wts[best].sum()
+
 
 def test_heuristic():
     # Create a random graph
@@ -626,7 +1176,7 @@ def test_heuristic():
         graph.nodes[u]['id'] = u
     print("Time to create graph: {}".format(time.time()-t))
     # Run Neighborhood Removal
-    adj = nx.adjacency_matrix(graph)
+    adj = ConflictGraph(nx.adjacency_matrix(graph))
     weights = np.array([graph.nodes[u]['weight'] for u in graph])
     vertices = np.array(range(len(weights)))
 
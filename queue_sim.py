@@ -0,0 +1,471 @@
+import os
+import sys
+from collections import deque
+
+import networkx as nx
+import numpy as np
+import scipy.io as sio
+
+from heuristics import greedy_search, dist_greedy_search, local_greedy_search, mwis_exact
+from heuristics import greedy_search_batch, local_greedy_search_batch
+from graph_util import poisson_graphs_from_dict
+
+# graph types generated by conflict_topology, any other type is read from the dataset
+SYNTHETIC_GRAPHS = ('star30', 'star20', 'star10', 'ba1', 'ba2', 'er', 'er1', 'tree', 'tree-line')
+
+
+def collision_free(cg, schedule):
+    '''
+    Links of a schedule without a scheduled conflicting neighbour, one sparse mat-vec per batch
+    :param cg: ConflictGraph of nflows links
+    :param schedule: boolean indicators, shape (nflows,) or (B, nflows)
+    :return: boolean indicators, same shape as schedule
+    '''
+    schedule = np.asarray(schedule, dtype=bool)
+    # adjacency is symmetric, row v of adj . x counts the scheduled neighbours of v
+    busy = cg.adj.dot(schedule.T.astype(float)).T
+    return schedule & (busy == 0)
+
+
+def channel_collision_batch(cg, nflows, link_rates_ts, schedules):
+    '''
+    Capacities of a batch of schedules
+    :param cg: ConflictGraph of nflows links
+    :param nflows: number of links
+    :param link_rates_ts: link rates, shape (nflows*n_ch,) shared by the batch or (B, nflows*n_ch)
+    :param schedules: boolean indicators over link-channel pairs, shape (B, nflows*n_ch), a pair v maps to link v % nflows
+    :return: capacities, shape (B, nflows)
+    '''
+    schedules = np.asarray(schedules, dtype=bool)
+    links = schedules.reshape(schedules.shape[0], -1, nflows).any(axis=1)
+    rates = np.asarray(link_rates_ts)[..., :nflows]
+    return np.where(collision_free(cg, links), rates, 0.0)
+
+
+def channel_collision(cg, nflows, link_rates_ts, schedule_mv):
+    """Return non-collision set of a schedule"""
+    schedule = np.zeros(shape=(nflows,), dtype=bool)
+    if schedule_mv.size > 0:
+        schedule[schedule_mv % nflows] = 1
+    rates = np.asarray(link_rates_ts)[:nflows]
+    return np.where(collision_free(cg, schedule), rates, 0.0)
+
+
+def conflict_topology(gtype, idx, seed, datapath, mat_names, ba2_nodes=70):
+    '''
+    Build the conflict graph of an episode
+    :param gtype: graph type, a name of a synthetic family or 'poisson', anything else loads a .mat instance
+    :param idx: index of the instance file in mat_names
+    :param seed: seed reported for synthetic graphs
+    :param datapath: folder of the instance files
+    :param mat_names: sorted instance file names
+    :param ba2_nodes: number of nodes of the 'ba2' graphs
+    :return: graph_i, adj_gK, nflows, seed
+    '''
+    if gtype == 'poisson':
+        mat_contents = sio.loadmat(os.path.join(datapath, mat_names[idx]))
+        gdict = mat_contents['gdict'][0, 0]
+        seed = mat_contents['random_seed'][0, 0]
+        graph_c, graph_i = poisson_graphs_from_dict(gdict)
+        adj_gK = nx.adjacency_matrix(graph_i)
+        flows = [e for e in graph_c.edges]
+        return graph_i, adj_gK, len(flows), seed
+    if gtype == 'star30':
+        graph_i = nx.star_graph(30)
+    elif gtype == 'star20':
+        graph_i = nx.star_graph(20)
+    elif gtype == 'star10':
+        graph_i = nx.star_graph(10)
+    elif gtype == 'ba1':
+        graph_i = nx.barabasi_albert_graph(70, 1)
+    elif gtype == 'ba2':
+        graph_i = nx.barabasi_albert_graph(ba2_nodes, 2)
+    elif gtype == 'er':
+        graph_i = nx.erdos_renyi_graph(50, 0.1)
+    elif gtype == 'er1':
+        graph_i = nx.erdos_renyi_graph(100, 0.1)
+    elif gtype == 'tree':
+        try:
+            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, seed=seed, tries=2000)
+        except:
+            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
+    elif gtype == 'tree-line':
+        try:
+            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, seed=seed, tries=2000)
+        except:
+            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
+        graph_i = nx.line_graph(graph_c)
+    else:
+        mat_contents = sio.loadmat(os.path.join(datapath, mat_names[idx]))
+        adj_gK = mat_contents['adj']
+        graph_i = nx.from_scipy_sparse_matrix(adj_gK)
+        return graph_i, adj_gK, adj_gK.shape[0], seed
+    adj_gK = nx.adjacency_matrix(graph_i)
+    return graph_i, adj_gK, adj_gK.shape[0], seed
+
+
+class QueueNetworkSimulator(object):
+    """
+    Queue network of one episode, every algorithm in algolist schedules its own copy of the queues.
+    Queue, departure, utility and schedule buffers are allocated once as (algorithms, timeslots, ...) arrays,
+    queue_mtx_dict, dep_pkts_dict, util_mtx_dict and schedule_dict are per-algorithm views of them.
+    With vectorized=True the queue and weight updates run for all algorithms at once and the greedy
+    baselines of the non-learned algorithms are solved as one batch per slot.
+    The 'shadow' lookahead only reads the queues of algoname, run() rolls it out for up to lookahead_chunk
+    start slots at once after the episode.
+    """
+    def __init__(self, cg, nflows, arrival_pkts, link_rates, algolist, algoname, wt_sel='qr', lp=5,
+                 agent=None, train=False, episode=0, vectorized=True, lookahead_chunk=1024):
+        self.cg = cg
+        self.nflows = nflows
+        self.arrival_pkts = arrival_pkts
+        self.link_rates = link_rates
+        self.algolist = list(algolist)
+        self.algoname = algoname
+        self.wt_sel = wt_sel
+        self.lp = lp
+        self.agent = agent
+        self.train = train
+        self.episode = episode
+        self.vectorized = vectorized
+        self.timeslots, _, self.n_ch = link_rates.shape
+        n_algo = len(self.algolist)
+        self.index = {algo: k for k, algo in enumerate(self.algolist)}
+
+        self.queue = np.zeros((n_algo, self.timeslots, nflows))
+        self.dep_pkts = np.zeros((n_algo, self.timeslots, nflows))
+        self.util = np.zeros((n_algo, self.timeslots))
+        self.util[:, 0] = 1
+        self.schedule = np.zeros((n_algo, self.timeslots, nflows))
+        self.wts = np.zeros((n_algo, nflows * self.n_ch))
+        self.capacity = np.zeros((n_algo, nflows))
+        self.lookahead_chunk = max(1, min(lookahead_chunk, self.timeslots - 1))
+        self.queue_shadow = np.zeros(shape=(lp, self.lookahead_chunk, nflows))
+        self.dep_pkts_shadow = np.zeros(shape=(lp, self.lookahead_chunk, nflows))
+        self.queue_mtx_dict = {algo: self.queue[k] for algo, k in self.index.items()}
+        self.dep_pkts_dict = {algo: self.dep_pkts[k] for algo, k in self.index.items()}
+        self.util_mtx_dict = {algo: self.util[k] for algo, k in self.index.items()}
+        self.schedule_dict = {algo: self.schedule[k] for algo, k in self.index.items()}
+        self.state_buff = deque(maxlen=self.timeslots)
+        self.mask_vec = np.arange(0, nflows)
+        self.t = 1
+        self._prepared = 0
+        self._batch = {}
+        self._ready = set()
+
+    def _weights(self, queue_t, t):
+        '''
+        Link weights of queue lengths queue_t, shape (..., nflows), flattened channel by channel
+        '''
+        rates = self.link_rates[t]
+        queue_mtx = np.repeat(queue_t[..., None], self.n_ch, axis=-1)
+        if self.wt_sel == 'qr':
+            wts0 = queue_mtx * rates
+        elif self.wt_sel == 'q':
+            wts0 = queue_mtx
+        elif self.wt_sel == 'qor':
+            wts0 = queue_mtx / rates
+        elif self.wt_sel == 'qrm':
+            wts0 = np.minimum(queue_mtx, rates)
+        else:
+            np.random.seed(self.episode*1000+t)
+            wts0 = np.random.uniform(0, 1, (self.nflows, self.n_ch))
+            wts0 = np.broadcast_to(wts0, queue_mtx.shape)
+        return np.swapaxes(wts0, -1, -2).reshape(queue_t.shape[:-1] + (self.nflows * self.n_ch,))
+
+    def _baseline_rows(self):
+        '''
+        Rows of wts that need a greedy reference, and rows of the non-learned algorithms scheduled by LGS
+        '''
+        need_ref = [self.index[algo] for algo in self.algolist if algo not in ('Benchmark', 'shadow')]
+        lgs_rows = [self.index[algo] for algo in self.algolist if algo == 'Greedy']
+        return need_ref, lgs_rows
+
+    def _batch_baselines(self, ref=None, lgs=None):
+        '''
+        Solve the greedy references and the LGS of the non-learned algorithms of the current slot in batches
+        :param ref: greedy schedules of the rows of _baseline_rows() if solved by the caller
+        :param lgs: LGS schedules of the rows of _baseline_rows() if solved by the caller
+        :return: dict of algorithm to (mwis, total_wt, total_wt0)
+        '''
+        rows, lgs_rows = self._baseline_rows()
+        out = {}
+        if not rows:
+            return out
+        if ref is None:
+            ref = greedy_search_batch(self.cg, self.wts[rows])
+        if lgs is None and lgs_rows:
+            lgs = local_greedy_search_batch(self.cg, self.wts[lgs_rows])
+        lgs = {self.algolist[k]: sol for k, sol in zip(lgs_rows, lgs)} if lgs_rows else {}
+        need_ref = [self.algolist[k] for k in rows]
+        for algo, k, sol in zip(need_ref, rows, ref):
+            total_wt0 = np.sum(self.wts[k][np.flatnonzero(sol)])
+            mwis = None
+            total_wt = None
+            if algo in lgs:
+                solu = np.flatnonzero(lgs[algo])
+                mwis = set(solu.tolist())
+                total_wt = np.sum(self.wts[k][solu])
+            out[algo] = (mwis, total_wt, total_wt0)
+        return out
+
+    def _lookahead(self, starts):
+        '''
+        Roll the queues of algoname forward lp slots with LGS schedules from every start slot, a chunk of start
+        slots per batched LGS call, and record the mean rollout queues and departures as the shadow of those slots.
+        The shadow schedule of a slot is the schedule of its last rollout slot within the episode
+        :param starts: start slots, each >= 1
+        '''
+        lp = self.lp
+        nflows = self.nflows
+        k = self.index['shadow']
+        ref = self.index[self.algoname]
+        starts = np.asarray(starts, dtype=np.int64)
+        for c0 in range(0, starts.size, self.lookahead_chunk):
+            ts = starts[c0:c0 + self.lookahead_chunk]
+            queue_shadow = self.queue_shadow[:, :ts.size, :]
+            dep_pkts_shadow = self.dep_pkts_shadow[:, :ts.size, :]
+            last = np.zeros((ts.size, nflows * self.n_ch), dtype=bool)
+            for ip in range(0, lp):
+                # rollouts past the end of the episode repeat their last slot
+                live = np.flatnonzero(ts + ip < self.timeslots)
+                if ip == 0:
+                    queue_shadow[0] = self.queue[ref, ts - 1, :]
+                else:
+                    queue_shadow[ip] = queue_shadow[ip - 1]
+                    dep_pkts_shadow[ip] = dep_pkts_shadow[ip - 1]
+                if live.size == 0:
+                    continue
+                slots = ts[live] + ip
+                queue_shadow[ip, live] += self.arrival_pkts[slots]
+                rates = np.swapaxes(self.link_rates[slots], 1, 2).reshape(live.size, nflows * self.n_ch)
+                wts = np.tile(queue_shadow[ip, live], (1, self.n_ch)) * rates
+                last[live] = local_greedy_search_batch(self.cg, wts)
+                capacity = channel_collision_batch(self.cg, nflows, rates, last[live])
+                dep_pkts_shadow[ip, live] = np.minimum(queue_shadow[ip, live], capacity)
+                queue_shadow[ip, live] -= dep_pkts_shadow[ip, live]
+            self.queue[k, ts, :] = np.mean(queue_shadow, axis=0)
+            self.dep_pkts[k, ts, :] = np.mean(dep_pkts_shadow, axis=0)
+            self.schedule[k, ts, :] = last[:, :nflows]
+            self.util[k, ts] = 1
+
+    @property
+    def batched(self):
+        """Weights and baselines of all algorithms are computed at once in prepare()"""
+        return self.vectorized and self.n_ch == 1 and self.wt_sel in ('qr', 'q', 'qor', 'qrm')
+
+    def prepare(self, baselines=True):
+        '''
+        Add the arrivals of the current slot to the queues, and if batched compute the weights and greedy
+        baselines of every algorithm
+        :param baselines: solve the baselines here, otherwise the caller sets them with _batch_baselines
+        '''
+        t = self.t
+        self.queue[:, t, :] = self.queue[:, t-1, :] + self.arrival_pkts[t, :]
+        self._batch = {}
+        self._ready = set()
+        if self.batched:
+            self.wts[:] = self._weights(self.queue[:, t, :], t)
+            if baselines:
+                self._batch = self._batch_baselines()
+            self._ready = set(self.algolist)
+        self._prepared = t
+
+    def weights(self, algo):
+        '''
+        Link weights of an algorithm in the current slot, call prepare() first
+        '''
+        k = self.index[algo]
+        if algo not in self._ready:
+            self.wts[k] = self._weights(self.queue[k, self.t, :], self.t)
+            self._ready.add(algo)
+        return self.wts[k]
+
+    def step(self, lookahead=True, utility=None):
+        '''
+        Advance every algorithm by one timeslot
+        :param lookahead: roll out the 'shadow' lookahead of the slot now, run() defers it to one batch
+        :param utility: dict of algorithm to (act_vals, state) of the GCN computed by the caller, for 'DGCN-LGS'
+        '''
+        if self._prepared != self.t:
+            self.prepare()
+        t = self.t
+        nflows = self.nflows
+        batch = self._batch
+        utility = {} if utility is None else utility
+        link_rates_ts = np.reshape(self.link_rates[t, :, :], nflows * self.n_ch, order='F')
+        for algo in self.algolist:
+            k = self.index[algo]
+            queue_t = self.queue[k, t, :]
+            wts1 = self.weights(algo)
+
+            if algo == "Greedy":
+                if algo in batch:
+                    mwis, total_wt, total_wt0 = batch[algo]
+                else:
+                    mwis, total_wt = local_greedy_search(self.cg, wts1)
+                    mwis0, total_wt0 = greedy_search(self.cg, wts1)
+                self.util[k, t] = total_wt/total_wt0
+            elif algo == "Greedy-Th":
+                mwis, total_wt = dist_greedy_search(self.cg, wts1, 0.1)
+                if algo in batch:
+                    total_wt0 = batch[algo][2]
+                else:
+                    mwis0, total_wt0 = greedy_search(self.cg, wts1)
+                self.util[k, t] = total_wt/total_wt0
+            elif algo == 'Benchmark':
+                mwis, total_wt, _ = mwis_exact(self.cg, wts1)
+                self.util[k, t] = 1.0
+            elif algo == 'DGCN-LGS':
+                if algo in batch:
+                    total_wt0 = batch[algo][2]
+                else:
+                    mwis0, total_wt0 = greedy_search(self.cg, wts1)
+                if algo in utility:
+                    act_vals, state = utility[algo][:2]
+                else:
+                    act_vals, state = self.agent.utility(self.cg, wts1, train=self.train)
+                if algo in utility and len(utility[algo]) > 2:
+                    mwis = utility[algo][2]
+                else:
+                    mwis, _ = local_greedy_search(self.cg, act_vals)
+                total_wt = np.sum(wts1[list(mwis)])
+                self.util[k, t] = total_wt / total_wt0
+                self.state_buff.append((state, act_vals, list(mwis), t))
+            elif algo == 'shadow':
+                continue
+            elif algo == 'scheduler':
+                if algo in batch:
+                    total_wt0 = batch[algo][2]
+                else:
+                    mwis0, total_wt0 = greedy_search(self.cg, wts1)
+                queue_mtx_algo = np.repeat(queue_t[:, None], self.n_ch, axis=1)
+                raw_wts = np.concatenate((queue_mtx_algo, self.link_rates[t, :, :]), axis=1)
+                mwis, actions, state = self.agent.scheduler(self.cg, raw_wts, train=self.train)
+                mwis, total_wt = local_greedy_search(self.cg, wts1*actions)
+                equal_wt = channel_collision(self.cg, nflows, wts1, np.array(list(mwis)))
+                total_wt = np.sum(equal_wt)
+                self.util[k, t] = total_wt / total_wt0
+                self.state_buff.append((state, actions, self.mask_vec, t))
+            else:
+                sys.exit("Unsupported algorithm {}".format(algo))
+
+            schedule_mv = np.array(list(mwis))
+            self.schedule[k, t, schedule_mv] = 1
+        self.capacity[:] = channel_collision_batch(self.cg, nflows, link_rates_ts, self.schedule[:, t, :])
+        np.minimum(self.queue[:, t, :], self.capacity, out=self.dep_pkts[:, t, :])
+        self.queue[:, t, :] -= self.dep_pkts[:, t, :]
+        if lookahead and 'shadow' in self.index:
+            self._lookahead([t])
+        self.t += 1
+
+    def run(self):
+        '''
+        Simulate the remaining timeslots of the episode
+        '''
+        t0 = self.t
+        while self.t < self.timeslots:
+            self.step(lookahead=False)
+        if 'shadow' in self.index and t0 < self.timeslots:
+            self._lookahead(np.arange(t0, self.timeslots))
+        return self
+
+    def summary(self):
+        '''
+        Queue statistics of every algorithm over the episode
+        :return: dict of algorithm to dict of metrics
+        '''
+        stats = {}
+        for algo in self.algolist:
+            queue_mtx = self.queue_mtx_dict[algo]
+            avg_queue_length_ts = np.mean(queue_mtx, axis=1)
+            med_queue_length_ts = np.median(queue_mtx, axis=1)
+            stats[algo] = {
+                'avg_q': np.mean(avg_queue_length_ts),
+                'med_q': np.mean(med_queue_length_ts),
+                'pct_q': np.percentile(queue_mtx, 95),
+                'pct2_q': np.percentile(queue_mtx, 5),
+                'avg_q_ts': avg_queue_length_ts,
+                'med_q_ts': med_queue_length_ts,
+                'avg_q_links': np.mean(queue_mtx, axis=0),
+                'avg_dep': np.mean(self.dep_pkts_dict[algo]),
+                'energy': np.sum(self.schedule_dict[algo], axis=0),
+                'avg_utility': np.nanmean(self.util_mtx_dict[algo]),
+            }
+        return stats
+
+
+class VectorQueueNetworkSimulator(object):
+    """
+    Independent episodes of equal length advanced in lockstep. In every slot the GCN of the 'DGCN-LGS' algorithm
+    of all episodes runs as one agent.utility_batch call over their block-diagonally packed conflict graphs.
+    Episodes on the same ConflictGraph object, e.g. one topology under several loads, also share one batched
+    greedy and LGS call per slot, the rest of the slot runs per episode.
+    """
+    def __init__(self, sims, agent, train=False):
+        self.sims = list(sims)
+        self.agent = agent
+        self.train = train
+        if len(set(sim.timeslots for sim in self.sims)) > 1:
+            raise ValueError("lockstep episodes need the same number of timeslots")
+        self.timeslots = self.sims[0].timeslots if self.sims else 0
+        self.t = 1
+
+    def step(self, lookahead=True):
+        '''
+        Advance every episode by one timeslot
+        '''
+        groups = {}
+        for sim in self.sims:
+            sim.prepare(baselines=False)
+            groups.setdefault(id(sim.cg), []).append(sim)
+        for group in groups.values():
+            self._group_baselines([sim for sim in group if sim.batched])
+        learned = [sim for sim in self.sims if 'DGCN-LGS' in sim.index]
+        utility = {}
+        if learned:
+            outs = self.agent.utility_batch([sim.cg for sim in learned],
+                                            [sim.weights('DGCN-LGS') for sim in learned], train=self.train)
+            utility = {id(sim): out for sim, out in zip(learned, outs)}
+            for group in groups.values():
+                group = [sim for sim in group if id(sim) in utility]
+                if len(group) < 2:
+                    continue
+                act_vals = np.stack([np.ravel(utility[id(sim)][0]) for sim in group])
+                for sim, sol in zip(group, local_greedy_search_batch(group[0].cg, act_vals)):
+                    utility[id(sim)] = utility[id(sim)] + (set(np.flatnonzero(sol).tolist()),)
+        for sim in self.sims:
+            util = {'DGCN-LGS': utility[id(sim)]} if id(sim) in utility else {}
+            sim.step(lookahead=lookahead, utility=util)
+        self.t += 1
+
+    def _group_baselines(self, group):
+        '''
+        Greedy references and LGS baselines of episodes on one topology in one batch each
+        '''
+        if not group:
+            return
+        rows = [sim._baseline_rows() for sim in group]
+        ref_wts = [sim.wts[ref_rows] for sim, (ref_rows, _) in zip(group, rows)]
+        lgs_wts = [sim.wts[lgs_rows] for sim, (_, lgs_rows) in zip(group, rows)]
+        if sum(len(w) for w in ref_wts) == 0:
+            return
+        ref = np.split(greedy_search_batch(group[0].cg, np.vstack(ref_wts)), np.cumsum([len(w) for w in ref_wts])[:-1])
+        lgs = [None] * len(group)
+        if sum(len(w) for w in lgs_wts) > 0:
+            lgs = np.split(local_greedy_search_batch(group[0].cg, np.vstack(lgs_wts)),
+                           np.cumsum([len(w) for w in lgs_wts])[:-1])
+        for sim, sim_ref, sim_lgs in zip(group, ref, lgs):
+            sim._batch = sim._batch_baselines(sim_ref, sim_lgs)
+
+    def run(self):
+        '''
+        Simulate the remaining timeslots of all episodes
+        '''
+        t0 = self.t
+        while self.t < self.timeslots:
+            self.step(lookahead=False)
+        for sim in self.sims:
+            if 'shadow' in sim.index and t0 < sim.timeslots:
+                sim._lookahead(np.arange(t0, sim.timeslots))
+        return self
@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ResultStore(object):
+    """
+    Append-only store of result rows, one JSON record per line, with an index of the completed keys.
+    Rows are flushed to disk as they are appended, so a sweep that dies keeps every committed row, and a
+    record cut off by a crash is ignored when the store is opened again.
+    """
+    def __init__(self, path, key_columns):
+        self.path = path
+        self.key_columns = tuple(key_columns)
+        self._rows = {}
+        self._newline = False
+        if os.path.isfile(path):
+            with open(path) as fin:
+                text = fin.read()
+            # a crash can leave a partial record without its line end, start the next commit on a new line
+            self._newline = len(text) > 0 and not text.endswith('\n')
+            for line in text.splitlines():
+                if line:
+                    try:
+                        row = json.loads(line)
+                        key = self.key(row)
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self._rows[key] = row
+
+    def key(self, row):
+        return tuple(_plain(row[c]) for c in self.key_columns)
+
+    def __contains__(self, key):
+        return tuple(key) in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key):
+        return self._rows.get(tuple(key))
+
+    def rows(self):
+        return list(self._rows.values())
+
+    def append(self, rows):
+        """Commit rows, a later row replaces an earlier row with the same key"""
+        rows = [{c: _plain(v) for c, v in row.items()} for row in rows]
+        if not rows:
+            return
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        # one write per commit so that concurrent writers do not interleave records
+        with open(self.path, 'a') as fout:
+            fout.write('\n' * self._newline + ''.join(json.dumps(row) + '\n' for row in rows))
+            fout.flush()
+            os.fsync(fout.fileno())
+        self._newline = False
+        for row in rows:
+            self._rows[self.key(row)] = row
@@ -0,0 +1,85 @@
+import numpy as np
+
+TRAFFIC_MODELS = ('legacy', 'poisson')
+
+
+def _random(rng):
+    return np.random if rng is None else rng
+
+
+def _rate_dtype(rate_lo, rate_hi):
+    return np.result_type(np.min_scalar_type(rate_lo), np.min_scalar_type(rate_hi))
+
+
+def legacy_arrivals(nflows, timeslots, arrival_rate, rng=None):
+    '''
+    Per-slot arrival counts of the original simulators: a Poisson process per flow with 2*timeslots*arrival_rate
+    exponential interarrivals, slot t counts the arrivals in [t-1, t).
+    Draws the same random numbers in the same order as one (nflows, 2*timeslots*arrival_rate) exponential sample,
+    one flow at a time, and bins the arrival times instead of comparing them with every slot
+    :return: arrival counts, shape (timeslots, nflows)
+    '''
+    rng = _random(rng)
+    n_draws = int(2*timeslots*arrival_rate)
+    arrival_pkts = np.zeros((timeslots, nflows), dtype=np.int32)
+    for f in range(nflows):
+        arrival_time = np.cumsum(rng.exponential(1.0/arrival_rate, n_draws))
+        slots = np.floor(arrival_time[arrival_time < timeslots - 1]).astype(np.int64) + 1
+        arrival_pkts[:, f] = np.bincount(slots, minlength=timeslots)
+    return arrival_pkts
+
+
+def poisson_arrivals(nflows, timeslots, arrival_rate, chunk_size=4096, rng=None):
+    '''
+    Per-slot Poisson arrival counts drawn in chunks of timeslots, the first slot is empty as in legacy_arrivals.
+    The counts do not depend on chunk_size
+    :return: arrival counts, shape (timeslots, nflows)
+    '''
+    rng = _random(rng)
+    arrival_pkts = np.zeros((timeslots, nflows), dtype=np.int32)
+    for t0 in range(1, timeslots, chunk_size):
+        t1 = min(t0 + chunk_size, timeslots)
+        arrival_pkts[t0:t1, :] = rng.poisson(arrival_rate, (t1 - t0, nflows))
+    return arrival_pkts
+
+
+def link_rate_trace(timeslots, nflows, n_ch=1, rate_lo=0, rate_hi=100, chunk_size=4096, rng=None):
+    '''
+    Normal link rates truncated to integers and clipped to [rate_lo, rate_hi], drawn in chunks of timeslots.
+    The rates do not depend on chunk_size
+    :return: link rates in the smallest integer dtype holding the range, shape (timeslots, nflows, n_ch)
+    '''
+    rng = _random(rng)
+    link_rates = np.zeros((timeslots, nflows, n_ch), dtype=_rate_dtype(rate_lo, rate_hi))
+    for t0 in range(0, timeslots, chunk_size):
+        t1 = min(t0 + chunk_size, timeslots)
+        rates = rng.normal(0.5 * (rate_lo + rate_hi), 0.25 * (rate_hi - rate_lo), size=[t1 - t0, nflows, n_ch])
+        # truncate toward zero before clipping, as astype(int) did
+        link_rates[t0:t1] = np.clip(np.trunc(rates), rate_lo, rate_hi)
+    return link_rates
+
+
+def generate_traffic(nflows, timeslots, load, n_ch=1, rate_lo=0, rate_hi=100, model='legacy', chunk_size=4096,
+                     rng=None):
+    '''
+    Arrivals and link rates of an episode
+    :param nflows: number of flows (links)
+    :param timeslots: number of timeslots
+    :param load: traffic load, the arrival rate is load times the mean link rate
+    :param n_ch: number of channels
+    :param rate_lo: lowest link rate
+    :param rate_hi: highest link rate
+    :param model: 'legacy' reproduces the traces of the original simulators for a seed, 'poisson' draws per-slot counts
+    :param chunk_size: timeslots drawn at once
+    :param rng: numpy RandomState or Generator, the global numpy random state by default
+    :return: arrival_pkts, shape (timeslots, nflows), link_rates, shape (timeslots, nflows, n_ch)
+    '''
+    arrival_rate = 0.5 * (rate_lo + rate_hi) * load
+    if model == 'legacy':
+        arrival_pkts = legacy_arrivals(nflows, timeslots, arrival_rate, rng)
+    elif model == 'poisson':
+        arrival_pkts = poisson_arrivals(nflows, timeslots, arrival_rate, chunk_size, rng)
+    else:
+        raise ValueError("unknown traffic model: {}".format(model))
+    link_rates = link_rate_trace(timeslots, nflows, n_ch, rate_lo, rate_hi, chunk_size, rng)
+    return arrival_pkts, link_rates
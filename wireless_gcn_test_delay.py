@@ -13,33 +13,56 @@ from scipy.spatial import distance_matrix
 import dwave_networkx as dnx
 import sys
 import os
+import random
+import multiprocessing
+from functools import partial
 from copy import copy, deepcopy
 from itertools import chain, combinations
-from heuristics import greedy_search, dist_greedy_search, local_greedy_search, mlp_gurobi
 from graph_util import *
+from conflict_graph import ConflictGraph
+from queue_sim import QueueNetworkSimulator, VectorQueueNetworkSimulator, SYNTHETIC_GRAPHS, conflict_topology
+from traffic import generate_traffic
+from result_store import ResultStore
 
 from runtime_config import flags
 flags.DEFINE_string('output', 'wireless', 'output folder')
 flags.DEFINE_string('test_datapath', './data/ER_Graph_Uniform_NP20_test', 'test dataset')
 flags.DEFINE_string('wt_sel', 'qr', 'qr: queue length * rate, q/r: q/r, q: queue length only, otherwise: random')
 flags.DEFINE_float('load_min', 0.01, 'traffic load min')
-flags.DEFINE_float('load_max', 0.15, 'traffic load max')
+flags.DEFINE_float('load_max', None, 'traffic load max, default: load_min, a single load')
 flags.DEFINE_float('load_step', 0.01, 'traffic load step')
 flags.DEFINE_integer('instances', 10, 'number of layers.')
 flags.DEFINE_integer('num_channels', 1, 'number of channels')
 flags.DEFINE_integer('opt', 0, 'test algorithm')
 flags.DEFINE_string('graph', 'poisson', 'type of graphs')
+flags.DEFINE_integer('envs', 1, 'number of episodes simulated in lockstep')
+flags.DEFINE_integer('workers', 1, 'number of worker processes, each loads the model once')
+flags.DEFINE_string('shard', '', 'k/n: simulate the k-th of n contiguous blocks of instances')
+flags.DEFINE_bool('merge', False, 'merge the result csv files of the n shards given by --shard=*/n into the csv of a serial run')
+flags.DEFINE_integer('sweep_seed', -1, 'entropy of the per-instance traffic seeds, negative: entropy of the store or fresh')
+flags.DEFINE_string('store', '', 'append-only result store, completed episodes are skipped on rerun, '
+                                 'default: results_store.jsonl in the output folder')
+flags.DEFINE_string('traffic', 'legacy', 'arrival model, legacy: exponential interarrivals of the original traces, poisson: per-slot poisson counts')
 
 from agent_dqn_util import A2CAgent
 from directory import find_model_folder
 
 model_origin = find_model_folder(flags.FLAGS, 'exp')
-flags1 = deepcopy(flags.FLAGS)
-agent = A2CAgent(flags1, 64000)
-try:
-    agent.load(model_origin)
-except:
-    print("unable to load {}".format(model_origin))
+agent = None
+
+
+def load_agent():
+    """Build the agent and load the model, once per process"""
+    global agent
+    if agent is None:
+        flags1 = deepcopy(flags.FLAGS)
+        agent = A2CAgent(flags1, 64000)
+        try:
+            agent.load(model_origin)
+        except:
+            print("unable to load {}".format(model_origin))
+    return agent
+
 
 n_instances = flags.FLAGS.instances
 
@@ -50,22 +73,6 @@ def emv(samples, pemv, n=3):
     return samples * k + pemv * (1-k)
 
 
-def channel_collision(adj, nflows, link_rates_ts, schedule_mv):
-    """Return non-collision set of a schedule"""
-    schedule = schedule_mv % nflows
-    wts = np.zeros(shape=(nflows,), dtype=np.bool)
-    if schedule.size > 0:
-        wts[schedule] = 1
-    non_collision = wts.copy()
-    for s in schedule:
-        _, nb_set = np.nonzero(adj[s])
-        if np.sum(wts[nb_set]) > 0:
-            non_collision[s] = 0
-    capacity = np.zeros(shape=(nflows,))
-    capacity[non_collision] = link_rates_ts[non_collision]
-    return capacity
-
-
 gtype = flags.FLAGS.graph
 train = False
 n_networks = 500
@@ -103,28 +110,37 @@ sim_rate_lo = 0
 # Testing load range (upper limit = 1/(average degree of conflict graphs))
 # 10.78 for 10 graphs, 10.56 for 20 graphs
 load_min = flags.FLAGS.load_min
-load_max = flags.FLAGS.load_max
+load_max = load_min if flags.FLAGS.load_max is None else flags.FLAGS.load_max
 load_step = flags.FLAGS.load_step
 wt_sel = flags.FLAGS.wt_sel
 
 
 output_dir = flags.FLAGS.output
-output_csv = os.path.join(output_dir,
-                          'metric_vs_load_summary_{}-channel_utility-{}_opt-{}_graph-{}_load-{:.2f}_layer-{}_test.csv'
-                          .format(n_ch, wt_sel, flags.FLAGS.opt, gtype, load_min, flags.FLAGS.num_layer)
-                          )
-
-res_list = []
-res_df = pd.DataFrame(columns=['graph',
-                               'seed',
-                               'load',
-                               'name',
-                               'avg_queue_len',
-                               '50p_queue_len',
-                               '95p_queue_len',
-                               '5p_queue_len',
-                               'avg_utility',
-                               'avg_degree'])
+
+
+def output_csv(load):
+    return os.path.join(output_dir,
+                        'metric_vs_load_summary_{}-channel_utility-{}_opt-{}_graph-{}_load-{:.2f}_layer-{}_test.csv'
+                        .format(n_ch, wt_sel, flags.FLAGS.opt, gtype, load, flags.FLAGS.num_layer)
+                        )
+
+
+def shard_csv(load, shard, n_shards):
+    if n_shards == 1:
+        return output_csv(load)
+    return output_csv(load)[:-len('.csv')] + '_shard-{}-of-{}.csv'.format(shard, n_shards)
+
+
+res_columns = ['graph',
+               'seed',
+               'load',
+               'name',
+               'avg_queue_len',
+               '50p_queue_len',
+               '95p_queue_len',
+               '5p_queue_len',
+               'avg_utility',
+               'avg_degree']
 # if os.path.isfile(output_csv):
 #     res_df = pd.read_csv(output_csv, index_col=0)
 
@@ -152,278 +168,192 @@ else:
 wts_sample_file = os.path.join(output_dir, 'samples.txt')
 
 load_array = np.round(np.arange(load_min, load_max+load_step, load_step), 3)
-# load = load_array[np.random.randint(0, len(load_array) - 1)]
-load = load_min
-
-buffer = deque(maxlen=20)
-pemv = np.array([2.0])
-pemv_best = np.array([1.05])
-for i in range(100):
-    np.random.seed(i+500)
-    idx = i
-    if gtype == 'poisson':
-        if i >= len(val_mat_names):
-            break
-        idx = i
-        mat_contents = sio.loadmat(os.path.join(datapath, val_mat_names[idx]))
-        gdict = mat_contents['gdict'][0, 0]
-        seed = mat_contents['random_seed'][0, 0]
-        graph_c, graph_i = poisson_graphs_from_dict(gdict)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        flows = [e for e in graph_c.edges]
-        nflows = len(flows)
-    elif gtype == 'star30':
-        graph_i = nx.star_graph(30)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'star20':
-        graph_i = nx.star_graph(20)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'star10':
-        graph_i = nx.star_graph(10)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'ba1':
-        graph_i = nx.barabasi_albert_graph(70, 1)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'ba2':
-        graph_i = nx.barabasi_albert_graph(70, 2)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'er':
-        graph_i = nx.erdos_renyi_graph(50, 0.1)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'tree':
-        try:
-            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, seed=i, tries=2000)
-        except:
-            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtype == 'tree-line':
-        try:
-            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, seed=i, tries=2000)
-        except:
-            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
-        graph_i = nx.line_graph(graph_c)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    else:
-        if i >= len(val_mat_names):
-            break
+# every load of the sweep is simulated on the same topologies in one pass
+load_array = load_array[load_array <= load_max + 1e-9]
+if load_array.size == 0:
+    load_array = np.array([load_min])
+
+
+def instance_seed(entropy, i):
+    """Traffic seed of instance i, independent of the number of workers and shards"""
+    return int(np.random.SeedSequence(entropy, spawn_key=(i,)).generate_state(1)[0])
+
+
+def parse_shard(shard):
+    """k/n to (k, n), a * for k gives (None, n)"""
+    if not shard:
+        return 0, 1
+    k, n = shard.split('/')
+    k, n = None if k == '*' else int(k), int(n)
+    if not (k is None or 0 <= k < n) or n < 1:
+        raise ValueError("invalid shard {}, expected k/n with 0 <= k < n".format(shard))
+    return k, n
+
+
+def shard_instances(n_graphs, shard, n_shards):
+    """Contiguous block of instances, the shards in order cover the instances of a serial run in its order"""
+    return list(range(n_graphs * shard // n_shards, n_graphs * (shard + 1) // n_shards))
+
+
+def run_instances(todo, entropy):
+    '''
+    Simulate the given loads on each instance, all episodes in lockstep
+    :param todo: loads to simulate per instance index, {i: loads}
+    :param entropy: entropy of the per-instance traffic seeds
+    :return: list of (i, idx, netcfg, load, rows, stats, runtime, epsilon) per episode
+    '''
+    agent = load_agent()
+    episodes = []
+    for i, loads in todo.items():
+        np.random.seed(i+500)
+        # networkx generators without a seed draw from the random module
+        random.seed(i+500)
         idx = i
-        mat_contents = sio.loadmat(os.path.join(datapath, val_mat_names[idx]))
-        adj_gK = mat_contents['adj']
-        wts = mat_contents['weights'].transpose()
-        nflows = adj_gK.shape[0]
-        seed = i
-        graph_i = nx.from_scipy_sparse_matrix(adj_gK)
-    netcfg = "Config: s {}, n {}, f {}, t {}".format(seed, sim_node, nflows, timeslots)
-
-    np.random.seed(seed)
-
-    d_list = []
-    for v in graph_i:
-        d_list.append(graph_i.degree[v])
-    avg_degree = np.nanmean(d_list)
-
-    treeseed = int(1000 * time.time()) % 10000000
-    np.random.seed(treeseed)
-
-    arrival_rate = 0.5 * (sim_rate_lo + sim_rate_hi) * load
-
-    interarrivals = np.random.exponential(1.0/arrival_rate, (nflows, int(2*timeslots*arrival_rate)))
-    arrival_time = np.cumsum(interarrivals, axis=1)
-    acc_pkts = np.zeros(shape=(nflows, timeslots))
-    for t in range(0, timeslots):
-        acc_pkts[:, t] = np.count_nonzero(arrival_time < t, axis=1)
-    arrival_pkts = np.diff(acc_pkts, prepend=0)
-    arrival_pkts = arrival_pkts.transpose()
-    link_rates = np.random.normal(0.5 * (sim_rate_lo + sim_rate_hi), 0.25 * (sim_rate_hi - sim_rate_lo),
-                                  size=[timeslots, nflows, n_ch])
-    link_rates = link_rates.astype(int)
-    link_rates[link_rates < sim_rate_lo] = sim_rate_lo
-    link_rates[link_rates > sim_rate_hi] = sim_rate_hi
-
-    to_print = []
+        graph_i, adj_gK, nflows, seed = conflict_topology(gtype, idx, i, datapath, val_mat_names)
+        cg_gK = ConflictGraph(adj_gK)
+        netcfg = "Config: s {}, n {}, f {}, t {}".format(seed, sim_node, nflows, timeslots)
+
+        np.random.seed(seed)
+
+        d_list = []
+        for v in graph_i:
+            d_list.append(graph_i.degree[v])
+        avg_degree = np.nanmean(d_list)
+
+        treeseed = instance_seed(entropy, i)
+        for load in loads:
+            # same random stream for every load, the traces of a row are reproducible from its seed and load
+            np.random.seed(treeseed)
+            arrival_pkts, link_rates = generate_traffic(nflows, timeslots, load, n_ch, sim_rate_lo, sim_rate_hi,
+                                                        model=flags.FLAGS.traffic)
+            sim = QueueNetworkSimulator(cg_gK, nflows, arrival_pkts, link_rates, algolist, algoname, wt_sel, lp=lp,
+                                        agent=agent, train=train, episode=i)
+            episodes.append((i, idx, seed, treeseed, netcfg, avg_degree, load, sim))
+
     time_start = time.time()
+    VectorQueueNetworkSimulator([episode[-1] for episode in episodes], agent, train=train).run()
+    runtime = (time.time() - time_start) / max(1, len(episodes))
 
-    weight_samples = []
-    queue_mtx_dict = {}
-    dep_pkts_dict = {}
-    util_mtx_dict = {}
-    schedule_dict = {}
-    wts_dict = {}
-    queue_algo = np.zeros(shape=(lp, nflows))
-    dep_pkts_algo = np.zeros(shape=(lp, nflows))
-    queue_shadow = np.zeros(shape=(lp, nflows))
-    dep_pkts_shadow = np.zeros(shape=(lp, nflows))
-    wts_shadow = np.zeros(shape=(lp, nflows))
-    for algo in algolist:
-        queue_mtx_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        dep_pkts_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        util_mtx_dict[algo] = np.zeros(timeslots)
-        schedule_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        util_mtx_dict[algo][0] = 1
-        wts_dict[algo] = np.zeros(shape=(nflows, n_ch))
-
-    state_buff = deque(maxlen=timeslots)
-    mask_vec = np.arange(0, nflows)
-
-    last_emb_vec = np.zeros(shape=(nflows*n_ch, ))
-    last_sol_vec = np.zeros(shape=(nflows*n_ch, ))
-    for t in range(1, timeslots):
+    results = []
+    for i, idx, seed, treeseed, netcfg, avg_degree, load, sim in episodes:
+        stats = sim.summary()
+        rows = []
         for algo in algolist:
-            queue_mtx_dict[algo][t, :] = queue_mtx_dict[algo][t-1, :] + arrival_pkts[t, :]
-            queue_mtx_algo = np.multiply(np.expand_dims(queue_mtx_dict[algo][t, :], axis=1), np.ones(shape=(nflows, n_ch)))
-            if wt_sel == 'qr':
-                wts0 = queue_mtx_algo * link_rates[t, :, :]
-            elif wt_sel == 'q':
-                wts0 = queue_mtx_algo
-            elif wt_sel == 'qor':
-                wts0 = queue_mtx_algo / link_rates[t, :, :]
-            elif wt_sel == 'qrm':
-                wts0 = np.minimum(queue_mtx_algo, link_rates[t, :, :])
-            else:
-                np.random.seed(i*1000+t)
-                wts0 = np.random.uniform(0, 1, (nflows, n_ch))
-            wts1 = np.reshape(wts0, nflows * n_ch, order='F')
-            raw_wts = np.concatenate((queue_mtx_algo, link_rates[t, :, :]), axis=1)
-
-            if algo == "Greedy":
-                wts_dict[algo] = wts1
-                mwis, total_wt = local_greedy_search(adj_gK, wts_dict[algo])
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = total_wt/total_wt0
-            elif algo == "Greedy-Th":
-                wts_dict[algo] = wts1
-                mwis, total_wt = dist_greedy_search(adj_gK, wts_dict[algo], 0.1)
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = total_wt/total_wt0
-            elif algo == 'Benchmark':
-                wts_dict[algo] = wts1
-                mwis, total_wt, _ = mlp_gurobi(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = 1.0
-            elif algo == 'DGCN-LGS':
-                wts_dict[algo] = wts1
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                act_vals, state = agent.utility(adj_gK, wts1, train=train)
-                mwis, _ = local_greedy_search(adj_gK, act_vals)
-                total_wt = np.sum(wts_dict[algo][list(mwis)])
-                util_mtx_dict[algo][t] = total_wt / total_wt0
-                state_buff.append((state, act_vals, list(mwis), t))
-            elif algo == 'shadow':
-                for ip in range(0, lp):
-                    if ip == 0:
-                        queue_shadow[0, :] = queue_mtx_dict[algoname][t-1, :] + arrival_pkts[t, :]
-                    else:
-                        if t + ip < timeslots:
-                            queue_shadow[ip, :] = queue_shadow[ip-1, :] + arrival_pkts[t+ip, :]
-                        else:
-                            queue_shadow[ip, :] = queue_shadow[ip - 1, :]
-                    queue_mtx_tmp = np.multiply(np.expand_dims(queue_shadow[ip, :], axis=1), np.ones(shape=(nflows, n_ch)))
-                    if t + ip < timeslots:
-                        wts_i = queue_mtx_tmp * link_rates[t+ip, :, :]
-                        mwis, total_wt = local_greedy_search(adj_gK, wts_i)
-                        schedule_mv = np.array(list(mwis))
-                        link_rates_ts = np.reshape(link_rates[t+ip, :, :], nflows * n_ch, order='F')
-                        capacity = channel_collision(adj_gK, nflows, link_rates_ts, schedule_mv)
-                        dep_pkts_shadow[ip, :] = np.minimum(queue_shadow[ip, :], capacity)
-                        queue_shadow[ip, :] = queue_shadow[ip, :] - dep_pkts_shadow[ip, :]
-                    else:
-                        dep_pkts_shadow[ip, :] = dep_pkts_shadow[ip-1, :]
-                        queue_shadow[ip, :] = queue_shadow[ip-1, :]
-                util_mtx_dict[algo][t] = 1
-            elif algo == 'scheduler':
-                wts_dict[algo] = wts1
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                mwis, actions, state = agent.scheduler(adj_gK, raw_wts, train=train)
-                mwis, total_wt = local_greedy_search(adj_gK, wts_dict[algo]*actions)
-                equal_wt = channel_collision(adj_gK, nflows, wts_dict[algo], np.array(list(mwis)))
-                total_wt = np.sum(equal_wt)
-                util_mtx_dict[algo][t] = total_wt / total_wt0
-                state_buff.append((state, actions, mask_vec, t))
-            else:
-                sys.exit("Unsupported opt {}".format(flags.FLAGS.opt))
-
-            schedule_mv = np.array(list(mwis))
-            link_rates_ts = np.reshape(link_rates[t, :, :], nflows*n_ch, order='F')
-            schedule_dict[algo][t, schedule_mv] = 1
-            capacity = channel_collision(adj_gK, nflows, link_rates_ts, schedule_mv)
-            if algo == 'shadow':
-                dep_pkts_dict[algo][t, :] = np.mean(dep_pkts_shadow[:, :], axis=0)
-                queue_mtx_dict[algo][t, :] = np.mean(queue_shadow[:, :], axis=0)
-            else:
-                dep_pkts_dict[algo][t, :] = np.minimum(queue_mtx_algo[:, 0], capacity)
-                queue_mtx_dict[algo][t, :] = queue_mtx_dict[algo][t, :] - dep_pkts_dict[algo][t, :]
-
-    avg_q_dict = {}
-    med_q_dict = {}
-    pct_q_dict = {}
-    pct2_q_dict = {}
-    avg_q_ts_dict = {}
-    med_q_ts_dict = {}
-    avg_q_links_dict = {}
-    avg_dep_dict = {}
-    energy_dict = {}
-    for algo in algolist:
-        avg_queue_length_ts = np.mean(queue_mtx_dict[algo], axis=1)
-        med_queue_length_ts = np.median(queue_mtx_dict[algo], axis=1)
-        pct_q_dict[algo] = np.percentile(queue_mtx_dict[algo], 95)
-        pct2_q_dict[algo] = np.percentile(queue_mtx_dict[algo], 5)
-        avg_queue_len_links = np.mean(queue_mtx_dict[algo], axis=0)
-        avg_dep_dict[algo] = np.mean(dep_pkts_dict[algo])
-        energy_dict[algo] = np.sum(schedule_dict[algo], axis=0)
-        avg_q_links_dict[algo] = avg_queue_len_links
-        avg_q_dict[algo] = np.mean(avg_queue_length_ts)
-        med_q_dict[algo] = np.mean(med_queue_length_ts)
-        avg_q_ts_dict[algo] = avg_queue_length_ts
-        med_q_ts_dict[algo] = med_queue_length_ts
-        std_flow_q = np.std(avg_queue_len_links)
-
-        res_df = res_df.append({'graph': seed,
-                                'seed': treeseed,
-                                'load': load,
-                                'name': algo,
-                                'avg_queue_len': avg_q_dict[algo],
-                                '50p_queue_len': med_q_dict[algo],
-                                '95p_queue_len': pct_q_dict[algo],
-                                '5p_queue_len': pct2_q_dict[algo],
-                                'avg_utility': np.nanmean(util_mtx_dict[algo]),
-                                'avg_degree': avg_degree
-                                }, ignore_index=True)
-
-    runtime = time.time() - time_start
-
-    if wt_sel == 'random':
-        buffer.append(np.mean(util_mtx_dict[algoname]))
+            rows.append({'graph': seed,
+                         'seed': treeseed,
+                         'load': load,
+                         'name': algo,
+                         'avg_queue_len': stats[algo]['avg_q'],
+                         '50p_queue_len': stats[algo]['med_q'],
+                         '95p_queue_len': stats[algo]['pct_q'],
+                         '5p_queue_len': stats[algo]['pct2_q'],
+                         'avg_utility': stats[algo]['avg_utility'],
+                         'avg_degree': avg_degree
+                         })
+        results.append((i, idx, netcfg, load, rows, stats, runtime, agent.epsilon))
+    return results
+
+
+def report(results, pemv):
+    for i, idx, netcfg, load, rows, stats, runtime, epsilon in results:
+        if wt_sel != 'random':
+            pemv = emv(stats[algoname]['avg_q']/stats[algoref]['avg_q'], pemv, 20)
+        print("{}-{}: {}, load: {}, ".format(idx, i, netcfg, load),
+            "q_med: {:.3f}, ".format(stats[algoname]['med_q']/stats['Greedy']['med_q']),
+            "q_95: {:.3f}, ".format(stats[algoname]['pct_q']/stats['Greedy']['pct_q']),
+            "q_avg: {:.3f}, ".format(stats[algoname]['avg_q']/stats['Greedy']['avg_q']),
+            "d_avg: {:.3f}, ".format(stats[algoname]['avg_dep']/stats['Greedy']['avg_dep']),
+            "u_gcn: {:.3f}, ".format(stats[algoname]['avg_utility']),
+            "run: {:.3f}s, loss: a {:.5f}, c {:.5f}, ratio: {:.3f}, e: {:.4f} ".format(runtime, 1.0, 1.0, pemv[0], epsilon),
+            )
+        sys.stdout.flush()
+    return pemv
+
+
+def merge_shards(n_shards):
+    missing = [shard_csv(load, k, n_shards) for load in load_array for k in range(n_shards)
+               if not os.path.isfile(shard_csv(load, k, n_shards))]
+    if missing:
+        sys.exit("missing shard results:\n" + "\n".join(missing))
+    for load in load_array:
+        parts = [pd.read_csv(shard_csv(load, k, n_shards), float_precision='round_trip') for k in range(n_shards)]
+        pd.concat(parts, ignore_index=True).to_csv(output_csv(load), index=False)
+
+
+# a result row is identified by graph type, instance, traffic seed, load, algorithm and model
+store_keys = ['gtype', 'instance', 'seed', 'load', 'name', 'model']
+model_key = "{}:opt-{}:{}:{}".format(model_origin, flags.FLAGS.opt, wt_sel, flags.FLAGS.traffic)
+
+
+def main():
+    shard, n_shards = parse_shard(flags.FLAGS.shard)
+    if flags.FLAGS.merge:
+        if n_shards < 2:
+            sys.exit("--merge needs the number of shards, e.g. --merge --shard=*/4")
+        merge_shards(n_shards)
+        print("Done!")
+        return
+    if shard is None:
+        sys.exit("--shard=*/n selects all shards and only works with --merge, simulate a shard with --shard=k/n")
+    store = ResultStore(flags.FLAGS.store or os.path.join(output_dir, 'results_store.jsonl'), store_keys)
+    # rerunning an unseeded sweep resumes it with the entropy of its stored rows
+    stored = [row['sweep_seed'] for row in store.rows() if row['gtype'] == gtype and row['model'] == model_key]
+    if flags.FLAGS.sweep_seed >= 0:
+        entropy = flags.FLAGS.sweep_seed
+    elif n_shards > 1:
+        sys.exit("--shard needs --sweep_seed, all shards have to share the instance seeds")
+    elif stored:
+        entropy = stored[-1]
+    else:
+        entropy = np.random.SeedSequence().entropy
+    print("Sweep seed: {}".format(entropy))
+
+    n_graphs = 100
+    if gtype not in SYNTHETIC_GRAPHS:
+        n_graphs = min(n_graphs, len(val_mat_names))
+    instances = shard_instances(n_graphs, shard, n_shards)
+    keys = {(i, load): [(gtype, i, instance_seed(entropy, i), float(load), algo, model_key) for algo in algolist]
+            for i in instances for load in load_array}
+    # only the episodes missing from the store run, a load added to a finished sweep runs alone
+    todo = {}
+    for i in instances:
+        loads = [load for load in load_array if not all(key in store for key in keys[(i, load)])]
+        if loads:
+            todo[i] = loads
+    n_done = len(keys) - sum(len(loads) for loads in todo.values())
+    if n_done > 0:
+        print("Skipping {} completed episodes of {}".format(n_done, store.path))
+    n_envs = max(1, flags.FLAGS.envs)
+    items = list(todo.items())
+    groups = [dict(items[j:j + n_envs]) for j in range(0, len(items), n_envs)]
+
+    def commit(results):
+        store.append([dict(row, gtype=gtype, instance=i, model=model_key, sweep_seed=entropy)
+                      for i, idx, netcfg, load, rows, stats, runtime, epsilon in results for row in rows])
+
+    pemv = np.array([2.0])
+    if flags.FLAGS.workers > 1:
+        # spawned workers import this module without running main() and load the model once in the initializer
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(flags.FLAGS.workers, initializer=load_agent) as pool:
+            for results in pool.imap(partial(run_instances, entropy=entropy), groups):
+                pemv = report(results, pemv)
+                commit(results)
     else:
-        buffer.append(avg_q_dict[algoname]/avg_q_dict[algoref])
-        pemv = emv(avg_q_dict[algoname]/avg_q_dict[algoref], pemv, 20)
-    print("{}-{}: {}, load: {}, ".format(idx, i, netcfg, load),
-        "q_med: {:.3f}, ".format(med_q_dict[algoname]/med_q_dict['Greedy']),
-        "q_95: {:.3f}, ".format(pct_q_dict[algoname]/pct_q_dict['Greedy']),
-        "q_avg: {:.3f}, ".format(avg_q_dict[algoname]/avg_q_dict['Greedy']),
-        "d_avg: {:.3f}, ".format(avg_dep_dict[algoname]/avg_dep_dict['Greedy']),
-        "u_gcn: {:.3f}, ".format(np.nanmean(util_mtx_dict[algoname])),
-        "run: {:.3f}s, loss: a {:.5f}, c {:.5f}, ratio: {:.3f}, e: {:.4f} ".format(runtime, 1.0, 1.0, pemv[0], agent.epsilon),
-        )
-    i += 1
-
-res_df.to_csv(output_csv, index=False)
-# with open('./wireless/metric_vs_load_full.json', 'w') as fout:
-#     json.dump(res_list, fout)
-
-print("Done!")
+        for group in groups:
+            results = run_instances(group, entropy)
+            pemv = report(results, pemv)
+            commit(results)
+
+    res_rows = [store.get(key) for i in instances for load in load_array for key in keys[(i, load)]]
+    res_df = pd.DataFrame(res_rows, columns=res_columns)
+    for load in load_array:
+        res_df[res_df['load'] == load].to_csv(shard_csv(load, shard, n_shards), index=False)
+    # with open('./wireless/metric_vs_load_full.json', 'w') as fout:
+    #     json.dump(res_list, fout)
+
+    print("Done!")
+
 
+if __name__ == "__main__":
+    main()
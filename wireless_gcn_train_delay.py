@@ -17,9 +17,11 @@ import sys
 import os
 from copy import copy, deepcopy
 from itertools import chain, combinations
-from heuristics import greedy_search, dist_greedy_search, local_greedy_search, mlp_gurobi
 # visualization
 from graph_util import *
+from conflict_graph import ConflictGraph
+from queue_sim import QueueNetworkSimulator, conflict_topology
+from traffic import generate_traffic
 
 from runtime_config import flags
 flags.DEFINE_string('output', 'wireless', 'output folder')
@@ -32,6 +34,7 @@ flags.DEFINE_integer('instances', 10, 'number of layers.')
 flags.DEFINE_integer('num_channels', 1, 'number of channels')
 flags.DEFINE_integer('opt', 0, 'test algorithm')
 flags.DEFINE_string('graph', 'poisson', 'type of graphs')
+flags.DEFINE_string('traffic', 'legacy', 'arrival model, legacy: exponential interarrivals of the original traces, poisson: per-slot poisson counts')
 
 from agent_dqn_util import A2CAgent
 from directory import find_model_folder
@@ -53,22 +56,6 @@ def emv(samples, pemv, n=3):
     return samples * k + pemv * (1-k)
 
 
-def channel_collision(adj, nflows, link_rates_ts, schedule_mv):
-    """Return non-collision set of a schedule"""
-    schedule = schedule_mv % nflows
-    wts = np.zeros(shape=(nflows,), dtype=np.bool)
-    if schedule.size > 0:
-        wts[schedule] = 1
-    non_collision = wts.copy()
-    for s in schedule:
-        _, nb_set = np.nonzero(adj[s])
-        if np.sum(wts[nb_set]) > 0:
-            non_collision[s] = 0
-    capacity = np.zeros(shape=(nflows,))
-    capacity[non_collision] = link_rates_ts[non_collision]
-    return capacity
-
-
 gtype = flags.FLAGS.graph
 train = True
 n_networks = 500
@@ -174,72 +161,8 @@ gtypep = np.array([0.2, 0.8])
 for i in range(100*flags.FLAGS.epochs):
     idx = np.random.randint(1, len(val_mat_names))
     gtypei = gtypes[np.random.choice(2, p=gtypep)]
-    if gtypei == 'poisson':
-        mat_contents = sio.loadmat(os.path.join(datapath, val_mat_names[idx]))
-        gdict = mat_contents['gdict'][0, 0]
-        seed = mat_contents['random_seed'][0, 0]
-        graph_c, graph_i = poisson_graphs_from_dict(gdict)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        flows = [e for e in graph_c.edges]
-        nflows = len(flows)
-    elif gtypei == 'star30':
-        graph_i = nx.star_graph(30)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'star20':
-        graph_i = nx.star_graph(20)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'star10':
-        graph_i = nx.star_graph(10)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'ba1':
-        graph_i = nx.barabasi_albert_graph(70, 1)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'ba2':
-        graph_i = nx.barabasi_albert_graph(100, 2)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'er':
-        graph_i = nx.erdos_renyi_graph(50, 0.1)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'er1':
-        graph_i = nx.erdos_renyi_graph(100, 0.1)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'tree':
-        try:
-            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, seed=i, tries=2000)
-        except:
-            graph_i = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    elif gtypei == 'tree-line':
-        try:
-            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, seed=i, tries=2000)
-        except:
-            graph_c = nx.random_powerlaw_tree(50, gamma=3.0, tries=1000)
-        graph_i = nx.line_graph(graph_c)
-        adj_gK = nx.adjacency_matrix(graph_i)
-        nflows = adj_gK.shape[0]
-        seed = i
-    else:
-        mat_contents = sio.loadmat(os.path.join(datapath, val_mat_names[idx]))
-        adj_gK = mat_contents['adj']
-        nflows = adj_gK.shape[0]
-        seed = i
-        graph_i = nx.from_scipy_sparse_matrix(adj_gK)
+    graph_i, adj_gK, nflows, seed = conflict_topology(gtypei, idx, i, datapath, val_mat_names, ba2_nodes=100)
+    cg_gK = ConflictGraph(adj_gK)
     netcfg = "{}: s {}, n {}, f {}, t {}".format(gtypei, seed, sim_node, nflows, timeslots)
 
     np.random.seed(idx)
@@ -256,157 +179,29 @@ for i in range(100*flags.FLAGS.epochs):
     np.random.seed(idx)
     # np.random.seed(treeseed)
 
-    arrival_rate = 0.5 * (sim_rate_lo + sim_rate_hi) * load
-
-    interarrivals = np.random.exponential(1.0/arrival_rate, (nflows, int(2*timeslots*arrival_rate)))
-    arrival_time = np.cumsum(interarrivals, axis=1)
-    acc_pkts = np.zeros(shape=(nflows, timeslots))
-    for t in range(0, timeslots):
-        acc_pkts[:, t] = np.count_nonzero(arrival_time < t, axis=1)
-    arrival_pkts = np.diff(acc_pkts, prepend=0)
-    arrival_pkts = arrival_pkts.transpose()
-    link_rates = np.random.normal(0.5 * (sim_rate_lo + sim_rate_hi), 0.25 * (sim_rate_hi - sim_rate_lo),
-                                  size=[timeslots, nflows, n_ch])
-    link_rates = link_rates.astype(int)
-    link_rates[link_rates < sim_rate_lo] = sim_rate_lo
-    link_rates[link_rates > sim_rate_hi] = sim_rate_hi
-
-    to_print = []
+    arrival_pkts, link_rates = generate_traffic(nflows, timeslots, load, n_ch, sim_rate_lo, sim_rate_hi,
+                                                model=flags.FLAGS.traffic)
+
     time_start = time.time()
 
-    weight_samples = []
-    queue_mtx_dict = {}
-    dep_pkts_dict = {}
-    util_mtx_dict = {}
-    schedule_dict = {}
-    wts_dict = {}
-    queue_algo = np.zeros(shape=(lp, nflows))
-    dep_pkts_algo = np.zeros(shape=(lp, nflows))
-    queue_shadow = np.zeros(shape=(lp, nflows))
-    dep_pkts_shadow = np.zeros(shape=(lp, nflows))
-    wts_shadow = np.zeros(shape=(lp, nflows))
+    sim = QueueNetworkSimulator(cg_gK, nflows, arrival_pkts, link_rates, algolist, algoname, wt_sel, lp=lp,
+                                agent=agent, train=train, episode=i)
+    sim.run()
+    stats = sim.summary()
+    queue_mtx_dict = sim.queue_mtx_dict
+    util_mtx_dict = sim.util_mtx_dict
+    state_buff = sim.state_buff
+
+    avg_q_dict = {algo: stats[algo]['avg_q'] for algo in algolist}
+    med_q_dict = {algo: stats[algo]['med_q'] for algo in algolist}
+    pct_q_dict = {algo: stats[algo]['pct_q'] for algo in algolist}
+    pct2_q_dict = {algo: stats[algo]['pct2_q'] for algo in algolist}
+    avg_q_ts_dict = {algo: stats[algo]['avg_q_ts'] for algo in algolist}
+    med_q_ts_dict = {algo: stats[algo]['med_q_ts'] for algo in algolist}
+    avg_q_links_dict = {algo: stats[algo]['avg_q_links'] for algo in algolist}
+    avg_dep_dict = {algo: stats[algo]['avg_dep'] for algo in algolist}
+    energy_dict = {algo: stats[algo]['energy'] for algo in algolist}
     for algo in algolist:
-        queue_mtx_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        dep_pkts_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        util_mtx_dict[algo] = np.zeros(timeslots)
-        schedule_dict[algo] = np.zeros(shape=(timeslots, nflows))
-        util_mtx_dict[algo][0] = 1
-        wts_dict[algo] = np.zeros(shape=(nflows, n_ch))
-
-    state_buff = deque(maxlen=timeslots)
-    mask_vec = np.arange(0, nflows)
-
-    last_emb_vec = np.zeros(shape=(nflows*n_ch, ))
-    last_sol_vec = np.zeros(shape=(nflows*n_ch, ))
-    for t in range(1, timeslots):
-        for algo in algolist:
-            queue_mtx_dict[algo][t, :] = queue_mtx_dict[algo][t-1, :] + arrival_pkts[t, :]
-            queue_mtx_algo = np.multiply(np.expand_dims(queue_mtx_dict[algo][t, :], axis=1), np.ones(shape=(nflows, n_ch)))
-            if wt_sel == 'qr':
-                wts0 = queue_mtx_algo * link_rates[t, :, :]
-            elif wt_sel == 'q':
-                wts0 = queue_mtx_algo
-            elif wt_sel == 'qor':
-                wts0 = queue_mtx_algo / link_rates[t, :, :]
-            elif wt_sel == 'qrm':
-                wts0 = np.minimum(queue_mtx_algo, link_rates[t, :, :])
-            else:
-                np.random.seed(i*1000+t)
-                wts0 = np.random.uniform(0, 1, (nflows, n_ch))
-            wts1 = np.reshape(wts0, nflows * n_ch, order='F')
-            raw_wts = np.concatenate((queue_mtx_algo, link_rates[t, :, :]), axis=1)
-
-            if algo == "Greedy":
-                wts_dict[algo] = wts1
-                mwis, total_wt = local_greedy_search(adj_gK, wts_dict[algo])
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = total_wt/total_wt0
-            elif algo == "Greedy-Th":
-                wts_dict[algo] = wts1
-                mwis, total_wt = dist_greedy_search(adj_gK, wts_dict[algo], 0.1)
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = total_wt/total_wt0
-            elif algo == 'Benchmark':
-                wts_dict[algo] = wts1
-                mwis, total_wt, _ = mlp_gurobi(adj_gK, wts_dict[algo])
-                util_mtx_dict[algo][t] = 1.0
-            elif algo == 'DGCN-LGS':
-                wts_dict[algo] = wts1
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                act_vals, state = agent.utility(adj_gK, wts1, train=train)
-                mwis, _ = local_greedy_search(adj_gK, act_vals)
-                total_wt = np.sum(wts_dict[algo][list(mwis)])
-                util_mtx_dict[algo][t] = total_wt / total_wt0
-                state_buff.append((state, act_vals, list(mwis), t))
-            elif algo == 'shadow':
-                for ip in range(0, lp):
-                    if ip == 0:
-                        queue_shadow[0, :] = queue_mtx_dict[algoname][t-1, :] + arrival_pkts[t, :]
-                    else:
-                        if t + ip < timeslots:
-                            queue_shadow[ip, :] = queue_shadow[ip-1, :] + arrival_pkts[t+ip, :]
-                        else:
-                            queue_shadow[ip, :] = queue_shadow[ip - 1, :]
-                    queue_mtx_tmp = np.multiply(np.expand_dims(queue_shadow[ip, :], axis=1), np.ones(shape=(nflows, n_ch)))
-                    if t + ip < timeslots:
-                        wts_i = queue_mtx_tmp * link_rates[t+ip, :, :]
-                        mwis, total_wt = local_greedy_search(adj_gK, wts_i)
-                        schedule_mv = np.array(list(mwis))
-                        link_rates_ts = np.reshape(link_rates[t+ip, :, :], nflows * n_ch, order='F')
-                        capacity = channel_collision(adj_gK, nflows, link_rates_ts, schedule_mv)
-                        dep_pkts_shadow[ip, :] = np.minimum(queue_shadow[ip, :], capacity)
-                        queue_shadow[ip, :] = queue_shadow[ip, :] - dep_pkts_shadow[ip, :]
-                    else:
-                        dep_pkts_shadow[ip, :] = dep_pkts_shadow[ip-1, :]
-                        queue_shadow[ip, :] = queue_shadow[ip-1, :]
-                util_mtx_dict[algo][t] = 1
-            elif algo == 'scheduler':
-                wts_dict[algo] = wts1
-                mwis0, total_wt0 = greedy_search(adj_gK, wts_dict[algo])
-                mwis, actions, state = agent.scheduler(adj_gK, raw_wts, train=train)
-                mwis, total_wt = local_greedy_search(adj_gK, wts_dict[algo]*actions)
-                equal_wt = channel_collision(adj_gK, nflows, wts_dict[algo], np.array(list(mwis)))
-                total_wt = np.sum(equal_wt)
-                util_mtx_dict[algo][t] = total_wt / total_wt0
-                state_buff.append((state, actions, mask_vec, t))
-            else:
-                sys.exit("Unsupported opt {}".format(flags.FLAGS.opt))
-
-            schedule_mv = np.array(list(mwis))
-            link_rates_ts = np.reshape(link_rates[t, :, :], nflows*n_ch, order='F')
-            schedule_dict[algo][t, schedule_mv] = 1
-            capacity = channel_collision(adj_gK, nflows, link_rates_ts, schedule_mv)
-            if algo == 'shadow':
-                dep_pkts_dict[algo][t, :] = np.mean(dep_pkts_shadow[:, :], axis=0)
-                queue_mtx_dict[algo][t, :] = np.mean(queue_shadow[:, :], axis=0)
-            else:
-                dep_pkts_dict[algo][t, :] = np.minimum(queue_mtx_algo[:, 0], capacity)
-                queue_mtx_dict[algo][t, :] = queue_mtx_dict[algo][t, :] - dep_pkts_dict[algo][t, :]
-
-    avg_q_dict = {}
-    med_q_dict = {}
-    pct_q_dict = {}
-    pct2_q_dict = {}
-    avg_q_ts_dict = {}
-    med_q_ts_dict = {}
-    avg_q_links_dict = {}
-    avg_dep_dict = {}
-    energy_dict = {}
-    for algo in algolist:
-        avg_queue_length_ts = np.mean(queue_mtx_dict[algo], axis=1)
-        med_queue_length_ts = np.median(queue_mtx_dict[algo], axis=1)
-        pct_q_dict[algo] = np.percentile(queue_mtx_dict[algo], 95)
-        pct2_q_dict[algo] = np.percentile(queue_mtx_dict[algo], 5)
-        avg_queue_len_links = np.mean(queue_mtx_dict[algo], axis=0)
-        avg_dep_dict[algo] = np.mean(dep_pkts_dict[algo])
-        energy_dict[algo] = np.sum(schedule_dict[algo], axis=0)
-        avg_q_links_dict[algo] = avg_queue_len_links
-        avg_q_dict[algo] = np.mean(avg_queue_length_ts)
-        med_q_dict[algo] = np.mean(med_queue_length_ts)
-        avg_q_ts_dict[algo] = avg_queue_length_ts
-        med_q_ts_dict[algo] = med_queue_length_ts
-        std_flow_q = np.std(avg_queue_len_links)
-
         res_df = res_df.append({'graph': seed,
                                 'seed': treeseed,
                                 'load': load,